@@ -0,0 +1,118 @@
+import hashlib
+import logging
+
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+import orjson
+
+from app.cache import SingleFlight, TTLCache
+from app.text import collapse_whitespace
+
+logger = logging.getLogger(__name__)
+
+
+class AIResult(NamedTuple):
+    """An upstream completion, kept as raw bytes so it can be replayed from cache"""
+
+    status_code: int
+    content: bytes
+    media_type: Optional[str]
+
+
+def normalize_payload(payload):
+    """Collapse runs of whitespace in string fields so re-indented prompts share a cache key"""
+    if isinstance(payload, dict):
+        return {key: normalize_payload(value) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [normalize_payload(value) for value in payload]
+    if isinstance(payload, str):
+        return collapse_whitespace(payload)
+    return payload
+
+
+def payload_key(payload) -> str:
+    return hashlib.sha256(orjson.dumps(normalize_payload(payload), option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class AIClient:
+    """
+    Proxy to the course AI completion API over one shared keep-alive client.
+    Successful completions are cached by normalized payload, and concurrent
+    identical requests wait on a single upstream call.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        cache_size: int = 256,
+        cache_ttl: float = 600,
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+    ):
+        self.url = url
+        self.headers = {key: value for key, value in (headers or {}).items() if value is not None}
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._flights = SingleFlight()
+
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    async def start(self):
+        """Open the shared HTTP client"""
+        self._client = httpx.AsyncClient(headers=self.headers, limits=self.limits, timeout=self.timeout)
+
+    async def close(self):
+        """Close the shared client and its pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def complete(self, payload) -> tuple:
+        """Return (AIResult, source) where source is 'hit', 'coalesced' or 'miss'"""
+        key = payload_key(payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, "hit"
+
+        result, shared = await self._flights.run(key, lambda: self._fetch(key, payload))
+        return result, "coalesced" if shared else "miss"
+
+    async def _fetch(self, key: str, payload) -> AIResult:
+        if self._client is None:
+            raise RuntimeError("AI client is not started")
+
+        self.upstream_calls += 1
+        try:
+            response = await self._client.post(self.url, json=payload)
+        except httpx.HTTPError:
+            self.upstream_errors += 1
+            raise
+
+        result = AIResult(response.status_code, response.content, response.headers.get("content-type"))
+        if response.status_code == 200:
+            self.cache.set(key, result)
+        else:
+            self.upstream_errors += 1
+            logger.warning(f"AI upstream returned {response.status_code}")
+        return result
+
+    def stats(self) -> dict:
+        """Return cache, coalescing and upstream counters"""
+        return {
+            "cache": self.cache.stats(),
+            "inflight": len(self._flights),
+            "coalesced": self._flights.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+        }
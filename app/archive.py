@@ -0,0 +1,310 @@
+import os
+import json
+import asyncio
+import logging
+import datetime
+
+from itertools import groupby
+from operator import itemgetter
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from app.partitions import PARTITIONED_TABLE, Partition, add_months, month_start
+from app.sensor_formats import SENSOR_SCHEMA, arrow_batch
+from app.sensor_series import SensorSeries
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_SECOND = datetime.timedelta(seconds=1)
+DAY = 86400
+
+# Rows read from a partition at a time while archiving it
+ARCHIVE_FETCH_ROWS = 50000
+
+# Schema metadata key listing each record batch's first timestamp, so a read
+# can pick the days it needs without decompressing the rest of the month
+BATCH_STARTS = b"batch_starts"
+
+SUFFIX = ".arrow"
+
+
+def epoch_seconds(value: datetime.datetime) -> int:
+    return (value - _EPOCH) // _SECOND
+
+
+def _parse_month(name: str) -> datetime.datetime:
+    return datetime.datetime.strptime(name[:-len(SUFFIX)], "%Y-%m")
+
+
+def _overlapping(starts: List[int], first: int, last: int) -> List[int]:
+    """Indexes of the day batches, given each one's first timestamp, that may hold readings in [first, last]"""
+    indexes = []
+    for index, batch_start in enumerate(starts):
+        next_start = starts[index + 1] if index + 1 < len(starts) else None
+        if batch_start > last or (next_start is not None and next_start <= first):
+            continue
+        indexes.append(index)
+    return indexes
+
+
+def _month_of(seconds: int) -> datetime.datetime:
+    return month_start(_EPOCH + datetime.timedelta(seconds=int(seconds)))
+
+
+class SensorArchive:
+    """
+    Cold storage for sensordata: one zstd-compressed Arrow IPC file per
+    (user_id, device_id, month) under directory, laid out as
+    <user_id>/<device_id>/<YYYY-MM>.arrow with one record batch per day.
+    Whole month partitions are archived and then dropped from MySQL; reads
+    memory-map the files and only decompress the days a range touches.
+
+    Only readings older than after_days are ever archived, so ranges newer
+    than that skip the archive without touching the disk. With archiving
+    switched off (after_days 0), scan() finds where any earlier archiving
+    left off, and ranges after that, or every range if nothing was ever
+    archived, skip it too. The directory must be shared by every replica
+    that serves reads.
+    """
+
+    def __init__(self, directory: str, after_days: int = 0, run: Callable[..., Awaitable] = asyncio.to_thread):
+        self.directory = directory
+        self.after_days = after_days
+        self.run = run
+        self.write_options = pa.ipc.IpcWriteOptions(compression="zstd")
+        # End of the newest archived month found by scan() or written since
+        self.archived_until: Optional[datetime.datetime] = None
+
+        self.files_written = 0
+        self.rows_archived = 0
+        self.files_expired = 0
+        self.reads = 0
+        self.batches_read = 0
+
+    def path(self, user_id: int, device_id: int, month: datetime.datetime) -> str:
+        return os.path.join(self.directory, str(user_id), str(device_id), f"{month:%Y-%m}{SUFFIX}")
+
+    def months(self, user_id: int, device_id: int) -> List[datetime.datetime]:
+        """Archived months of a device, oldest first"""
+        try:
+            names = os.listdir(os.path.join(self.directory, str(user_id), str(device_id)))
+        except FileNotFoundError:
+            return []
+        return sorted(_parse_month(name) for name in names if name.endswith(SUFFIX))
+
+    @property
+    def enabled(self) -> bool:
+        """True if reads may need the archive: archiving is on or has left files behind"""
+        return self.after_days > 0 or self.archived_until is not None
+
+    def scan(self) -> Optional[datetime.datetime]:
+        """Find the end of the newest archived month on disk; blocking, run once at startup"""
+        newest = None
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(SUFFIX):
+                    month = _parse_month(name)
+                    newest = month if newest is None else max(newest, month)
+        self.archived_until = add_months(newest, 1) if newest is not None else None
+        return self.archived_until
+
+    def may_contain(self, start: datetime.datetime) -> bool:
+        """False when every reading from start onwards is still in MySQL"""
+        if not self.after_days:
+            return self.archived_until is not None and start < self.archived_until
+        return start < datetime.datetime.now() - datetime.timedelta(days=self.after_days)
+
+    async def fetch(self, user_id: int, device_id: int, start: datetime.datetime, end: datetime.datetime) -> SensorSeries:
+        """Archived readings in [start, end], read off the event loop"""
+        if not self.may_contain(start):
+            return SensorSeries.empty()
+        return await self.run(self.read, user_id, device_id, start, end)
+
+    async def stream(self, user_id: int, device_id: int, start: datetime.datetime, end: datetime.datetime):
+        """
+        Archived readings in [start, end] in time order, one day's record batch
+        at a time, so a long range never has to be held in memory at once.
+        Every file read happens off the event loop.
+        """
+        if not self.may_contain(start):
+            return
+
+        first, last = epoch_seconds(start), epoch_seconds(end)
+        self.reads += 1
+        for month in await self.run(self.months, user_id, device_id):
+            if not month_start(start) <= month <= end:
+                continue
+            path = self.path(user_id, device_id, month)
+            for index in await self.run(self._day_indexes, path, first, last):
+                series = await self.run(self._read_day, path, index)
+                series = series.between(first, last)
+                if len(series):
+                    yield series
+
+    def read(self, user_id: int, device_id: int, start: datetime.datetime, end: datetime.datetime) -> SensorSeries:
+        """Archived readings with start <= timestamp <= end, in time order; blocking"""
+
+        first, last = epoch_seconds(start), epoch_seconds(end)
+        parts = []
+        for month in self.months(user_id, device_id):
+            if month_start(start) <= month <= end:
+                parts.extend(self._read_days(self.path(user_id, device_id, month), first, last))
+
+        self.reads += 1
+        return SensorSeries.concat(parts).between(first, last)
+
+    def _read_days(self, path: str, first: int, last: int) -> List[SensorSeries]:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            parts = []
+            for index in _overlapping(json.loads(reader.schema.metadata[BATCH_STARTS]), first, last):
+                parts.append(SensorSeries.from_arrow(reader.get_batch(index)))
+                self.batches_read += 1
+            return parts
+
+    def _day_indexes(self, path: str, first: int, last: int) -> List[int]:
+        with pa.memory_map(path) as source:
+            return _overlapping(json.loads(pa.ipc.open_file(source).schema.metadata[BATCH_STARTS]), first, last)
+
+    def _read_day(self, path: str, index: int) -> SensorSeries:
+        with pa.memory_map(path) as source:
+            series = SensorSeries.from_arrow(pa.ipc.open_file(source).get_batch(index))
+        self.batches_read += 1
+        return series
+
+    def read_file(self, path: str) -> SensorSeries:
+        with pa.memory_map(path) as source:
+            return SensorSeries.from_arrow(pa.ipc.open_file(source).read_all())
+
+    def write(self, user_id: int, device_id: int, month: datetime.datetime, series: SensorSeries):
+        """
+        Write one month of a device's readings, replacing any earlier file
+        atomically, so re-archiving a partition after a crash is harmless
+        """
+
+        path = self.path(user_id, device_id, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        day_edges = np.flatnonzero(np.diff(series.timestamps // DAY)) + 1
+        bounds = [0] + day_edges.tolist() + [len(series)]
+        starts = [int(series.timestamps[start]) for start in bounds[:-1]]
+        schema = SENSOR_SCHEMA.with_metadata({BATCH_STARTS: json.dumps(starts)})
+
+        temporary = path + ".tmp"
+        with pa.OSFile(temporary, "wb") as sink:
+            with pa.ipc.new_file(sink, schema, options=self.write_options) as writer:
+                for start, stop in zip(bounds, bounds[1:]):
+                    writer.write_batch(arrow_batch(series.slice(start, stop), schema))
+        with open(temporary, "rb+") as written:
+            os.fsync(written.fileno())
+        os.replace(temporary, path)
+
+        self.files_written += 1
+        if self.archived_until is None or month >= self.archived_until:
+            self.archived_until = add_months(month, 1)
+
+    def archive_partition(self, cursor, partition: Partition) -> int:
+        """
+        Copy one sensordata month partition into archive files; blocking, run on
+        the maintenance connection. Returns the number of readings archived.
+        """
+
+        cursor.execute(
+            f"""
+            SELECT user_id, device_id, TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', timestamp),
+                   temperature, pressure, temperature_unit, pressure_unit
+            FROM {PARTITIONED_TABLE} PARTITION ({partition.name})
+            ORDER BY user_id, device_id, timestamp
+            """
+        )
+
+        # Rows arrive grouped by device, so one device's month is held at a time
+        archived = 0
+        current, parts = None, []
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_FETCH_ROWS)
+            for key, group in groupby(rows, key=itemgetter(0, 1)):
+                if key != current:
+                    if current is not None:
+                        archived += self._write_device(*current, SensorSeries.concat(parts), partition)
+                    current, parts = key, []
+                parts.append(SensorSeries.from_rows([row[2:] for row in group]))
+            if not rows:
+                break
+        if current is not None:
+            archived += self._write_device(*current, SensorSeries.concat(parts), partition)
+
+        self.rows_archived += archived
+        logger.info(f"Archived {archived} readings from partition {partition.name}")
+        return archived
+
+    def _write_device(self, user_id: int, device_id: int, series: SensorSeries, partition: Partition) -> int:
+        partition_month = add_months(partition.less_than, -1)
+        count = len(series)
+        month = _month_of(series.timestamps[0])
+        while len(series):
+            next_month = add_months(month, 1)
+            stop = int(np.searchsorted(series.timestamps, epoch_seconds(next_month), side="left"))
+            if stop:
+                chunk = series.slice(0, stop)
+                path = self.path(user_id, device_id, month)
+                if month != partition_month and os.path.exists(path):
+                    # Late readings for a month archived earlier end up in the oldest
+                    # remaining partition; fold them into that month's file
+                    chunk = SensorSeries.concat([self.read_file(path), chunk]).sorted()
+                self.write(user_id, device_id, month, chunk)
+                series = series.slice(stop, len(series))
+            month = next_month
+        return count
+
+    def expire(
+        self,
+        cutoff: datetime.datetime,
+        user_ids: Optional[List[int]] = None,
+    ) -> int:
+        """Remove archived readings older than cutoff, for the same user selection as a row delete; returns files removed"""
+
+        if not os.path.isdir(self.directory) or (user_ids is not None and not user_ids):
+            return 0
+
+        removed = 0
+        for user in os.listdir(self.directory):
+            if not user.isdigit():
+                continue
+            if user_ids is not None and int(user) not in user_ids:
+                continue
+            user_dir = os.path.join(self.directory, user)
+            for device in filter(str.isdigit, os.listdir(user_dir)):
+                for month in self.months(int(user), int(device)):
+                    path = self.path(int(user), int(device), month)
+                    if add_months(month, 1) <= cutoff:
+                        os.remove(path)
+                        removed += 1
+                    elif month < cutoff:
+                        # The month the cutoff falls in keeps its newer readings
+                        stored = self.read_file(path)
+                        kept = stored.between(epoch_seconds(cutoff), int(stored.timestamps[-1]))
+                        if not len(kept):
+                            os.remove(path)
+                            removed += 1
+                        elif len(kept) < len(stored):
+                            self.write(int(user), int(device), month, kept)
+
+        self.files_expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        """Return archive write, read and expiry counters"""
+        return {
+            "directory": self.directory,
+            "after_days": self.after_days,
+            "archived_until": self.archived_until,
+            "files_written": self.files_written,
+            "rows_archived": self.rows_archived,
+            "files_expired": self.files_expired,
+            "reads": self.reads,
+            "batches_read": self.batches_read,
+        }
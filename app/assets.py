@@ -0,0 +1,159 @@
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Tuple
+
+from fastapi import Response
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Hashed names never change content, so browsers may keep them for a year without revalidating
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Text assets worth compressing; images are already compressed formats
+COMPRESSIBLE = {".css", ".js", ".svg", ".ico", ".json", ".txt", ".map"}
+MIN_COMPRESS_SIZE = 512  # bytes
+
+# /static/<path> references inside templates
+STATIC_REFERENCE = re.compile(r"/static/([\w./-]+)")
+
+
+class Asset(NamedTuple):
+    """A fingerprinted static file and its precompressed variants"""
+
+    path: str  # file on disk
+    media_type: str
+    etag: str
+    encodings: Mapping[str, bytes]  # content-coding -> compressed body
+
+
+def accepted_encodings(header: str) -> set:
+    """Content-codings from an Accept-Encoding header, ignoring any with q=0"""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        name, _, q = params.strip().partition("=")
+        try:
+            if name.strip() == "q" and float(q) == 0:
+                continue
+        except ValueError:
+            continue
+        if coding.strip():
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class AssetManifest:
+    """
+    Content-hashed names for everything under the static directory, built once
+    at startup. css/dashboard.css becomes css/dashboard.<hash>.css; text assets
+    get gzip (and brotli, when installed) bodies computed up front.
+    """
+
+    def __init__(self, directory: str, exclude: Tuple[str, ...] = ("templates",)):
+        self.directory = directory
+        self.exclude = exclude
+        self._hashed: Mapping[str, str] = MappingProxyType({})
+        self._assets: Mapping[str, Asset] = MappingProxyType({})
+
+    def build(self):
+        """Fingerprint and precompress every asset, replacing the whole manifest at once"""
+        hashed: Dict[str, str] = {}
+        assets: Dict[str, Asset] = {}
+        compressed = 0
+
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = sorted(d for d in dirs if os.path.relpath(os.path.join(root, d), self.directory) not in self.exclude)
+            for filename in sorted(files):
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    body = f.read()
+
+                digest = hashlib.sha256(body).hexdigest()
+                stem, ext = os.path.splitext(name)
+                hashed_name = f"{stem}.{digest[:10]}{ext}"
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+                encodings = {}
+                if ext.lower() in COMPRESSIBLE and len(body) >= MIN_COMPRESS_SIZE:
+                    encodings["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+                    if brotli is not None:
+                        encodings["br"] = brotli.compress(body, quality=11)
+                    # Keep only variants that actually save bytes
+                    encodings = {coding: data for coding, data in encodings.items() if len(data) < len(body)}
+                    compressed += bool(encodings)
+
+                hashed[name] = hashed_name
+                assets[hashed_name] = Asset(path, media_type, f'"{digest[:32]}"', MappingProxyType(encodings))
+
+        self._hashed = MappingProxyType(hashed)
+        self._assets = MappingProxyType(assets)
+        logger.info(f"Fingerprinted {len(assets)} static assets ({compressed} precompressed, brotli {'on' if brotli else 'off'})")
+
+    def url(self, name: str) -> str:
+        """Public URL for an asset, hashed if the manifest knows it"""
+        return "/static/" + self._hashed.get(name, name)
+
+    def rewrite(self, text: str) -> str:
+        """Point /static/... references in a template at the hashed names"""
+        if not self._hashed:
+            return text
+        return STATIC_REFERENCE.sub(lambda m: self.url(m.group(1)), text)
+
+    def get(self, hashed_name: str):
+        return self._assets.get(hashed_name)
+
+    def stats(self) -> dict:
+        return {
+            "assets": len(self._assets),
+            "precompressed": sum(1 for asset in self._assets.values() if asset.encodings),
+            "brotli": brotli is not None,
+        }
+
+
+class HashedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves fingerprinted names from the manifest with
+    immutable caching and the best precompressed variant the client accepts.
+    Unhashed paths still work and fall back to the normal revalidating behaviour.
+    """
+
+    def __init__(self, *, manifest: AssetManifest, **kwargs):
+        super().__init__(**kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope) -> Response:
+        asset = self.manifest.get(path.replace(os.sep, "/"))
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        request_headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        headers = {"Cache-Control": IMMUTABLE, "ETag": asset.etag}
+        if asset.encodings:
+            headers["Vary"] = "Accept-Encoding"
+
+        if request_headers.get("if-none-match") == asset.etag:
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for coding in ("br", "gzip"):
+            if coding in accepted and coding in asset.encodings:
+                headers["Content-Encoding"] = coding
+                return Response(content=asset.encodings[coding], media_type=asset.media_type, headers=headers)
+
+        return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,175 @@
+import zlib
+import logging
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Already compressed, or must reach the client unbuffered
+SKIP_MEDIA_TYPES = ("text/event-stream", "application/vnd.apache.parquet", "image/", "application/zip", "application/gzip")
+
+DEFAULT_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _Brotli:
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+def available_encodings() -> Dict[str, type]:
+    """Content-codings this process can produce, by name"""
+    encoders = {"gzip": _Gzip}
+    if brotli is not None:
+        encoders["br"] = _Brotli
+    if zstandard is not None:
+        encoders["zstd"] = _Zstd
+    return encoders
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses under the given path prefixes with
+    the first of `encodings` the client accepts. Bodies smaller than
+    minimum_size are sent as-is. Streamed bodies are compressed chunk by chunk
+    and flushed, so NDJSON/CSV exports keep arriving incrementally.
+    """
+
+    def __init__(
+        self,
+        app,
+        encodings: Iterable[str] = ("br", "zstd", "gzip"),
+        levels: Optional[Dict[str, int]] = None,
+        minimum_size: int = 1024,
+        paths: Tuple[str, ...] = ("/api/",),
+    ):
+        self.app = app
+        encoders = available_encodings()
+        self.encodings = [coding for coding in encodings if coding in encoders]
+        self._encoders = encoders
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+        self.minimum_size = minimum_size
+        self.paths = paths
+        logger.info(f"Compressing {', '.join(paths)} responses >= {minimum_size} bytes with {', '.join(self.encodings)}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        coding = next((c for c in self.encodings if c in accepted), None)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(send, coding, self._encoders[coding], self.levels[coding], self.minimum_size))
+
+
+class _CompressingSend:
+    """Wraps an ASGI send callable for one response"""
+
+    def __init__(self, send, coding: str, encoder: type, level: int, minimum_size: int):
+        self.send = send
+        self.coding = coding
+        self.encoder = encoder
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = {key.lower(): value for key, value in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            self.passthrough = (
+                b"content-encoding" in headers
+                or message["status"] in (204, 304)
+                or content_type.startswith(SKIP_MEDIA_TYPES)
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                # Whole body in one message: compress only if it is worth it
+                if len(body) < self.minimum_size:
+                    self.passthrough = True
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                compressor = self.encoder(self.level)
+                body = compressor.compress(body) + compressor.finish()
+                await self.send(self._start_message(len(body)))
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            self.compressor = self.encoder(self.level)
+            await self.send(self._start_message(None))
+
+        data = self.compressor.compress(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _start_message(self, length: Optional[int]) -> dict:
+        headers = [
+            (key, value) for key, value in self.start.get("headers", [])
+            if key.lower() not in (b"content-length", b"vary")
+        ]
+        vary = [value for key, value in self.start.get("headers", []) if key.lower() == b"vary"]
+        headers.append((b"content-encoding", self.coding.encode("latin-1")))
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**self.start, "headers": headers}
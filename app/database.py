@@ -1,64 +1,90 @@
 import os
+import math
 import time
+import asyncio
 import logging
+import datetime
 import mysql.connector
 
-from typing import Optional
+from typing import Any, Callable, Dict, Optional
 from dotenv import load_dotenv
 from mysql.connector import Error
 
+from app.archive import SensorArchive
+from app.db_pool import ConnectionPool
+from app.devices import DeviceRef
+from app.migrations import SCHEMA_VERSION, run_migrations
+from app.partitions import (
+    MAINTENANCE_LOCK,
+    PARTITIONED_TABLE,
+    add_future_partitions,
+    delete_rows_before,
+    drop_partitions,
+    expired_partitions,
+)
+from app.queries import PreparedStatements, SessionUser
+from app.retention import RetentionPlan
+from app.sensor_series import SensorSeries
+
 # Load environment variables
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared connection pool, created by init_db_pool() in the app lifespan
+_pool: Optional[ConnectionPool] = None
+
+# Cold storage for sensordata months moved out of MySQL, set by set_sensor_archive()
+_archive: Optional[SensorArchive] = None
+
+
+def connect_db() -> mysql.connector.MySQLConnection:
+    """Open one database connection; blocking, so the app only calls it on the pool's executor"""
+
+    connection = mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST'),
+        port=int(os.getenv('MYSQL_PORT')),
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD'),
+        database=os.getenv('MYSQL_DATABASE'),
+        ssl_ca=os.getenv('MYSQL_SSL_CA'),  # Path to CA certificate file
+        ssl_verify_identity=True,
+        autocommit=True,  # Pooled connections must not hold a read snapshot between queries
+        connection_timeout=int(os.getenv('MYSQL_CONNECT_TIMEOUT', '10'))  # A stalled server must not pin a worker thread
+    )
+    try:
+        # Test the connection
+        connection.ping(reconnect=False)
+    except Exception:
+        connection.close()
+        raise
+    logger.info("Database connection established successfully")
+    return connection
+
 
 def get_db_connection(
     max_retries: int = 12,  # 12 retries = 1 minute total (12 * 5 seconds)
     retry_delay: int = 5,  # 5 seconds between retries
 ) -> mysql.connector.MySQLConnection:
-    """Create database connection with retry mechanism"""
-    
-    connection: Optional[mysql.connector.MySQLConnection] = None
-    attempt = 1
-    last_error = None
+    """
+    Create database connection with retry mechanism.
+    Blocks the calling thread while retrying, so it is for command-line scripts
+    only; the app connects through the pool, which retries with asyncio.sleep.
+    """
 
-    while attempt <= max_retries:
+    last_error = None
+    for attempt in range(1, max_retries + 1):
         try:
-            connection = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST'),
-            port=int(os.getenv('MYSQL_PORT')),
-            user=os.getenv('MYSQL_USER'),
-            password=os.getenv('MYSQL_PASSWORD'),
-            database=os.getenv('MYSQL_DATABASE'),
-            ssl_ca=os.getenv('MYSQL_SSL_CA'),  # Path to CA certificate file
-            ssl_verify_identity=True
-            )
-
-            # Test the connection
-            connection.ping(reconnect=True, attempts=1, delay=0)
-            logger.info("Database connection established successfully")
-            return connection
-
+            return connect_db()
         except Error as err:
             last_error = err
             logger.warning(
                 f"Connection attempt {attempt}/{max_retries} failed: {err}. "
                 f"Retrying in {retry_delay} seconds..."
             )
-
-            if connection is not None:
-                try:
-                    connection.close()
-                except Exception:
-                    pass
-
-            if attempt == max_retries:
-                break
-
-            time.sleep(retry_delay)
-            attempt += 1
+            if attempt < max_retries:
+                time.sleep(retry_delay)
 
     raise Exception(
         f"Failed to connect to database after {max_retries} attempts. "
@@ -66,120 +92,159 @@ def get_db_connection(
     )
 
 
-async def setup_database():
-    """Creates user and session tables and populates initial user data if provided"""
+def set_sensor_archive(archive: Optional[SensorArchive]):
+    """Merge archived readings into sensor reads and archive old partitions during maintenance"""
 
-    connection = None
-    cursor = None
+    global _archive
+    _archive = archive
 
-    # Define table schemas
-    table_schemas = {
-        "users": """
-            CREATE TABLE users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) NOT NULL UNIQUE,
-                location VARCHAR(255),
-                password VARCHAR(255) NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """,
-        "sessions": """
-            CREATE TABLE sessions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                token VARCHAR(255) NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                expires_at DATETIME NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """,
-        "devices": """
-            CREATE TABLE devices (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                device_id VARCHAR(100) NOT NULL,
-                mac_address VARCHAR(100) NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """,
-        "wardrobes": """
-            CREATE TABLE wardrobes (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                name VARCHAR(100) NOT NULL,
-                color VARCHAR(50),
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """,
-        "sensordata": """
-            CREATE TABLE sensordata (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                device_id VARCHAR(100) NOT NULL,
-                temperature FLOAT,
-                pressure FLOAT,
-                temperature_unit VARCHAR(50) NOT NULL,
-                pressure_unit VARCHAR(50) NOT NULL,
-                timestamp DATETIME NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """
-    }
 
-    try:
-        # Get database connection
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        logger.info("Dropping existing tables...")
+async def init_db_pool() -> ConnectionPool:
+    """Create the shared connection pool and open its minimum number of connections"""
 
-        drop_order = ["sensordata", "wardrobes", "devices", "sessions", "users"]
-        for table_name in drop_order:
-            logger.info(f"Dropping table {table_name} if exists...")
-            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-            connection.commit()
+    global _pool
+    if _pool is not None:
+        return _pool
 
-        create_order = ["users", "sessions", "devices", "wardrobes", "sensordata"]
-        for table_name in create_order:
-            try:
-                # Create table
-                logger.info(f"Creating table {table_name}...")
-                cursor.execute(table_schemas[table_name])
-                connection.commit()
-                logger.info(f"Table {table_name} created successfully")
+    pool = ConnectionPool(
+        connect_db,
+        min_size=int(os.getenv('MYSQL_POOL_MIN_SIZE', '2')),
+        max_size=int(os.getenv('MYSQL_POOL_MAX_SIZE', '10')),
+        max_idle=float(os.getenv('MYSQL_POOL_MAX_IDLE', '300')),
+        max_lifetime=float(os.getenv('MYSQL_POOL_MAX_LIFETIME', '3600')),
+        health_check_interval=float(os.getenv('MYSQL_POOL_HEALTH_CHECK_INTERVAL', '30')),
+        acquire_timeout=float(os.getenv('MYSQL_POOL_ACQUIRE_TIMEOUT', '10')),
+        disconnect_errors=(mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError),
+        max_waiters=int(os.getenv('MYSQL_POOL_MAX_WAITERS', '100')),
+        connect_retries=int(os.getenv('MYSQL_CONNECT_RETRIES', '12')),
+        retry_base_delay=float(os.getenv('MYSQL_RETRY_BASE_DELAY', '0.5')),
+        retry_max_delay=float(os.getenv('MYSQL_RETRY_MAX_DELAY', '10')),
+    )
+    await pool.open()
+    _pool = pool
+    return _pool
 
-            except Error as e:
-                logger.error(f"Error creating table {table_name}: {e}")
-                raise
 
-    except Exception as e:
-        logger.error(f"Database setup failed: {e}")
-        raise
+async def close_db_pool():
+    """Close the shared connection pool"""
+
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
 
+def get_db_pool() -> ConnectionPool:
+    """Return the shared connection pool, failing loudly if the app has not started it"""
+
+    if _pool is None:
+        raise RuntimeError("Database pool is not initialized; call init_db_pool() first")
+    return _pool
+
+
+def _run_with_cursor(connection, statements: Optional[PreparedStatements], func: Callable, dictionary: bool, transaction: bool) -> Any:
+    """Run func(cursor) or func(cursor, statements) on a pooled connection; executed on a pool worker thread"""
+
+    cursor = None
+    try:
+        if transaction:
+            connection.start_transaction()
+        cursor = connection.cursor(dictionary=dictionary)
+        result = func(cursor) if statements is None else func(cursor, statements)
+        if transaction:
+            connection.commit()
+        return result
+    except Exception:
+        if transaction:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+        raise
     finally:
         if cursor:
             cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
-            logger.info("Database connection closed")
+
+
+async def run_query(func: Callable, dictionary: bool = False, transaction: bool = False, prepared: bool = False) -> Any:
+    """
+    Run func(cursor) against a pooled connection without blocking the event loop.
+    Connections are in autocommit mode; set transaction to group several statements.
+    With prepared set, func(cursor, statements) also gets the connection's
+    PreparedStatements for the hot queries below.
+    """
+
+    pool = get_db_pool()
+    async with pool.connection() as connection:
+        statements = None
+        if prepared:
+            cache = pool.connection_cache(connection)
+            statements = cache.get("statements")
+            if statements is None:
+                statements = cache["statements"] = PreparedStatements(connection)
+        return await pool.run(_run_with_cursor, connection, statements, func, dictionary, transaction)
+
+
+# Hot-path statements, run as server-side prepared statements. Each must stay a
+# single module-level string: the connector re-prepares whenever it is handed a
+# different string object.
+SESSION_USER_SQL = """
+    SELECT u.id, u.name, u.email, u.location, u.created_at, s.expires_at
+    FROM sessions s
+    JOIN users u ON u.id = s.user_id
+    WHERE s.token = %s
+"""
+
+DEVICE_BY_MAC_SQL = "SELECT user_id, id FROM devices WHERE mac_address = %s"
+
+SENSOR_INSERT_SQL = """
+    INSERT INTO sensordata (user_id, device_id, temperature, pressure,
+                           temperature_unit, pressure_unit, timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Timestamps come back as epoch seconds (naive, like the column) so a
+# SensorSeries can take them without building a datetime per row
+SENSOR_RANGE_SQL = """
+    SELECT TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', timestamp),
+           temperature, pressure, temperature_unit, pressure_unit
+    FROM sensordata
+    WHERE timestamp BETWEEN %s AND %s
+    AND user_id = %s
+    AND device_id = %s
+    ORDER BY timestamp
+"""
+
+# Rows fetched at a time while building a SensorSeries, so only one chunk of
+# row tuples exists alongside the arrays
+SERIES_FETCH_ROWS = 10000
+
+
+async def setup_database():
+    """Bring the schema up to date by applying any pending migrations"""
+
+    def migrate(cursor):
+        return run_migrations(cursor)
+
+    try:
+        applied = await run_query(migrate)
+        if applied:
+            logger.info(f"Applied migrations {applied}; schema is at version {SCHEMA_VERSION}")
+        else:
+            logger.info(f"Schema is up to date at version {SCHEMA_VERSION}")
+    except Exception as e:
+        logger.error(f"Database setup failed: {e}")
+        raise
 
 
 async def create_user(name: str, email: str, password: str, location: str) -> bool:
     """Create a new user in the database"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
+    def insert(cursor):
         cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
         if cursor.fetchone():
             raise ValueError(f"User with email {email} already exists")
-            
+
         cursor.execute(
             """
             INSERT INTO users (name, email, location, password, created_at) 
@@ -187,69 +252,47 @@ async def create_user(name: str, email: str, password: str, location: str) -> bo
             """,
             (name, email, location, password)
         )
-        connection.commit()
-        
         return True
+
+    try:
+        return await run_query(insert, transaction=True)
     except Exception as e:
         logger.error(f"New user creation failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def get_user_by_email(email: str) -> Optional[dict]:
     """Retrieve user from database by email"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+    def select(cursor):
         cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
         return cursor.fetchone()
-    
+
+    try:
+        return await run_query(select, dictionary=True)
     except Exception as e:
         logger.error(f"Retrieving user by email failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def get_user_by_id(user_id: int) -> Optional[dict]:
     """Retrieve user from database by ID"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+    def select(cursor):
         cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
         return cursor.fetchone()
-    
+
+    try:
+        return await run_query(select, dictionary=True)
     except Exception as e:
         logger.error(f"Retrieving user by ID failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
-            
+
 
 async def create_session(user_id: int, token: str, expires_at: str) -> bool:
     """Create a new session in the database"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+    def insert(cursor):
         cursor.execute(
             """
             INSERT INTO sessions (user_id, token, created_at, expires_at) 
@@ -257,76 +300,46 @@ async def create_session(user_id: int, token: str, expires_at: str) -> bool:
             """, 
             (user_id, token, expires_at)
         )
-        connection.commit()
         return True
+
+    try:
+        return await run_query(insert)
     except Exception as e:
         logger.error(f"Session setup failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-async def get_session(token: str) -> Optional[dict]:
-    """Retrieve session from database"""
+async def get_session_user(token: str) -> Optional[SessionUser]:
+    """Retrieve the user owning a session, plus the session expiry, in one prepared query"""
+
+    def select(cursor, statements):
+        row = statements.fetchone(SESSION_USER_SQL, (token,))
+        return SessionUser(*row) if row else None
 
-    connection = None
-    cursor = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(
-            """
-            SELECT *
-            FROM sessions
-            WHERE token= %s
-            """,
-            (token, )
-        )
-        return cursor.fetchone()
-    
+        return await run_query(select, prepared=True)
     except Exception as e:
-        logger.error(f"Retrieving session failed: {e}")
+        logger.error(f"Retrieving session user failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def delete_session(session_id: str) -> bool:
     """Delete a session from the database"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+    def delete(cursor):
         cursor.execute("DELETE FROM sessions WHERE token = %s", (session_id,))
-        connection.commit()
         return True
-    
+
+    try:
+        return await run_query(delete)
     except Exception as e:
         logger.error(f"Deleting session failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 async def add_clothing(user_id: int, name: str, color: str) -> bool:
     """Create a new piece of clothing for a given user"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
+    def insert(cursor):
         cursor.execute(
             """
             INSERT INTO wardrobes (user_id, name, color, created_at) 
@@ -334,27 +347,19 @@ async def add_clothing(user_id: int, name: str, color: str) -> bool:
             """,
             (user_id, name, color)
         )
-        connection.commit()
         return True
-    
+
+    try:
+        return await run_query(insert)
     except Exception as e:
         logger.error(f"Clothing creation failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def remove_clothing(user_id: int, clothing_id: int) -> bool:
     """Remove a specific piece of clothing for a given user"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+    def delete(cursor):
         cursor.execute(
             """
             DELETE FROM wardrobes WHERE 
@@ -363,27 +368,19 @@ async def remove_clothing(user_id: int, clothing_id: int) -> bool:
             """, 
             (user_id, clothing_id)
         )
-        connection.commit()
         return True
-    
+
+    try:
+        return await run_query(delete)
     except Exception as e:
         logger.error(f"Deleting clothing failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def update_clothing(user_id: int, clothing_id: int, new_name: str, new_color: str) -> bool:
     """Update specific piece of clothing for a given user"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+    def update(cursor):
         cursor.execute(
             """
             UPDATE wardrobes 
@@ -393,26 +390,19 @@ async def update_clothing(user_id: int, clothing_id: int, new_name: str, new_col
             """, 
             (new_name, new_color, user_id, clothing_id)
         )
-        connection.commit()
         return True
-    
+
+    try:
+        return await run_query(update)
     except Exception as e:
         logger.error(f"Updating clothing failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def get_wardrobe(user_id: int) -> list:
     """Retrieve user wardrobe from database"""
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+
+    def select(cursor):
         cursor.execute(
             """
             SELECT *
@@ -421,29 +411,18 @@ async def get_wardrobe(user_id: int) -> list:
             """,
             (user_id,)
         )
-        clothes = cursor.fetchall()
-    
-        for clothing in clothes:
-            clothing['created_at'] = clothing['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return clothes 
-    
+        return cursor.fetchall()
+
+    try:
+        return await run_query(select, dictionary=True)
     except Exception as e:
         logger.error(f"Retrieving wardrobe failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 async def get_clothing(user_id: int, clothing_id: int) -> Optional[dict]:
     """Retrieve specific clothing item from database"""
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+
+    def select(cursor):
         cursor.execute(
             """
             SELECT *
@@ -452,30 +431,19 @@ async def get_clothing(user_id: int, clothing_id: int) -> Optional[dict]:
             """,
             (user_id, clothing_id)
         )
-        clothing = cursor.fetchone()
-        
-        if clothing:
-            clothing['created_at'] = clothing['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return clothing 
-    
+        return cursor.fetchone() 
+
+    try:
+        return await run_query(select, dictionary=True)
     except Exception as e:
         logger.error(f"Retrieving clothing item failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def get_devices(user_id: int) -> list:
     """Retrieve user devices from database"""
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+
+    def select(cursor):
         cursor.execute(
             """
             SELECT *
@@ -484,29 +452,19 @@ async def get_devices(user_id: int) -> list:
             """,
             (user_id,)
         )
-        devices = cursor.fetchall()
-        
-        for device in devices:
-            device['created_at'] = device['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return devices
+        return cursor.fetchall()
+
+    try:
+        return await run_query(select, dictionary=True)
     except Exception as e:
         logger.error(f"Retrieving devices failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def get_device(user_id: int, device_id: str) -> Optional[dict]:
     """Retrieve specific device from database"""
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+
+    def select(cursor):
         cursor.execute(
             """
             SELECT * FROM devices WHERE 
@@ -515,31 +473,21 @@ async def get_device(user_id: int, device_id: str) -> Optional[dict]:
             """,
             (user_id, device_id)
         )
-        device = cursor.fetchone()
-        
-        if device:
-            device['created_at'] = device['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return device
+        return cursor.fetchone()
+
+    try:
+        return await run_query(select, dictionary=True)
     except Exception as e:
         logger.error(f"Retrieving device failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
 async def add_device(user_id: int, device_id: str, mac_address: str) -> bool:
     """
     Create a new device for a given user
     """
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+
+    def insert(cursor):
         cursor.execute(
             """
             SELECT COUNT(*) 
@@ -560,26 +508,18 @@ async def add_device(user_id: int, device_id: str, mac_address: str) -> bool:
             """,
             (user_id, device_id, mac_address)
         )
-        connection.commit()
         return True
-    
+
+    try:
+        return await run_query(insert, transaction=True)
     except Exception as e:
         logger.error(f"Device creation failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 async def remove_device(user_id: int, device_id: str, mac_address: str) -> bool:
     """Remove a specific device for a given user"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+    def delete(cursor):
         cursor.execute(
             """
             DELETE FROM devices WHERE 
@@ -589,105 +529,482 @@ async def remove_device(user_id: int, device_id: str, mac_address: str) -> bool:
             """, 
             (user_id, device_id, mac_address)
         )
-        connection.commit()
         return True
-    
+
+    try:
+        return await run_query(delete)
     except Exception as e:
         logger.error(f"Deleting device failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-async def add_sensorData(user_id: int, device_id: str, temperature: float, pressure: float, temperature_unit: str, pressure_unit: str, timestamp: str) -> bool:
+# Rollup tables maintained alongside sensordata, finest first: table -> bucket width in seconds
+SENSOR_ROLLUPS = {"sensordata_1m": 60, "sensordata_1h": 3600}
+
+ROLLUP_UPSERT = """
+    INSERT INTO {table} (user_id, device_id, bucket_start, sample_count,
+                         temperature_sum, temperature_min, temperature_max, temperature_last,
+                         pressure_sum, pressure_min, pressure_max, pressure_last,
+                         temperature_unit, pressure_unit, last_timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        sample_count = sample_count + VALUES(sample_count),
+        temperature_sum = temperature_sum + VALUES(temperature_sum),
+        temperature_min = LEAST(temperature_min, VALUES(temperature_min)),
+        temperature_max = GREATEST(temperature_max, VALUES(temperature_max)),
+        pressure_sum = pressure_sum + VALUES(pressure_sum),
+        pressure_min = LEAST(pressure_min, VALUES(pressure_min)),
+        pressure_max = GREATEST(pressure_max, VALUES(pressure_max)),
+        temperature_last = IF(VALUES(last_timestamp) >= last_timestamp, VALUES(temperature_last), temperature_last),
+        pressure_last = IF(VALUES(last_timestamp) >= last_timestamp, VALUES(pressure_last), pressure_last),
+        temperature_unit = IF(VALUES(last_timestamp) >= last_timestamp, VALUES(temperature_unit), temperature_unit),
+        pressure_unit = IF(VALUES(last_timestamp) >= last_timestamp, VALUES(pressure_unit), pressure_unit),
+        last_timestamp = GREATEST(last_timestamp, VALUES(last_timestamp))
+"""
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _rollup_rows(readings: list, bucket_seconds: int) -> list:
+    """
+    Pre-aggregate (user_id, device_id, temperature, pressure, units, timestamp)
+    readings per bucket. Timestamps must be datetimes, already parsed by the caller.
+    """
+
+    buckets = {}
+    for user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp in readings:
+        # NaN, as sensors report a failed read, is stored as NULL and kept out of rollups
+        if temperature is None or pressure is None or not math.isfinite(temperature) or not math.isfinite(pressure):
+            continue
+        seconds = int((timestamp - _EPOCH).total_seconds())
+        key = (user_id, device_id, _EPOCH + datetime.timedelta(seconds=seconds - seconds % bucket_seconds))
+
+        row = buckets.get(key)
+        if row is None:
+            buckets[key] = [1, temperature, temperature, temperature, temperature,
+                            pressure, pressure, pressure, pressure,
+                            temperature_unit, pressure_unit, timestamp]
+            continue
+        row[0] += 1
+        row[1] += temperature
+        row[2] = min(row[2], temperature)
+        row[3] = max(row[3], temperature)
+        row[5] += pressure
+        row[6] = min(row[6], pressure)
+        row[7] = max(row[7], pressure)
+        if timestamp >= row[11]:
+            row[4], row[8], row[9], row[10], row[11] = temperature, pressure, temperature_unit, pressure_unit, timestamp
+
+    return [key + tuple(row) for key, row in buckets.items()]
+
+
+def _update_rollups(cursor, readings: list):
+    """Fold new readings into every rollup table; runs inside the insert's transaction"""
+
+    for table, bucket_seconds in SENSOR_ROLLUPS.items():
+        rows = _rollup_rows(readings, bucket_seconds)
+        if rows:
+            cursor.executemany(ROLLUP_UPSERT.format(table=table), rows)
+
+
+async def add_sensorData(user_id: int, device_id: int, temperature: float, pressure: float, temperature_unit: str, pressure_unit: str, timestamp: datetime.datetime) -> bool:
     """Store sensor data"""
 
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        cursor.execute(
-            """
-            INSERT INTO sensordata (user_id, device_id, temperature, pressure, 
-                                   temperature_unit, pressure_unit, timestamp) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """,
-            (user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)
-        )
-        connection.commit()
+    def insert(cursor, statements):
+        reading = (user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)
+        statements.execute(SENSOR_INSERT_SQL, reading)
+        _update_rollups(cursor, [reading])
         return True
-    
+
+    try:
+        return await run_query(insert, transaction=True, prepared=True)
     except Exception as e:
         logger.error(f"Sensor data creation failed: {e}")
         raise 
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-async def get_device_by_mac_address(mac_address: str) -> Optional[dict]:
-    """Retrieve device from database by MAC address"""
-    connection = None
-    cursor = None
+async def get_sensorData(user_id: int, device_id: int, time_start: str, time_end: str) -> SensorSeries:
+    """Retrieve sensor data from database as a SensorSeries, converted chunk by chunk as rows arrive"""
+
+    def select(cursor, statements):
+        chunks = statements.fetchchunks(SENSOR_RANGE_SQL, (time_start, time_end, user_id, device_id), SERIES_FETCH_ROWS)
+        return SensorSeries.concat(SensorSeries.from_rows(rows) for rows in chunks)
+
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+        if _archive is None:
+            return await run_query(select, prepared=True)
+        # Archived months and recent rows are read side by side; a late reading can
+        # land in MySQL dated before the newest archived one, hence the sort
+        cold, hot = await asyncio.gather(
+            _archive.fetch(user_id, device_id, datetime.datetime.fromisoformat(time_start), datetime.datetime.fromisoformat(time_end)),
+            run_query(select, prepared=True),
+        )
+        return SensorSeries.concat([cold, hot]).sorted()
+    except Exception as e:
+        logger.error(f"Retrieving sensor data failed: {e}")
+        raise
+
+
+async def get_devices_by_mac_addresses(mac_addresses: list) -> Dict[str, DeviceRef]:
+    """
+    Retrieve the owning user and row ID for several MAC addresses in one query.
+    A single MAC, the common case for the device registry, uses a prepared statement.
+    """
+
+    if not mac_addresses:
+        return {}
+
+    def select(cursor, statements):
+        if len(mac_addresses) == 1:
+            row = statements.fetchone(DEVICE_BY_MAC_SQL, (mac_addresses[0],))
+            return {mac_addresses[0]: DeviceRef(*row)} if row else {}
+
+        placeholders = ", ".join(["%s"] * len(mac_addresses))
         cursor.execute(
+            f"""
+            SELECT mac_address, user_id, id FROM devices WHERE mac_address IN ({placeholders})
+            """,
+            tuple(mac_addresses)
+        )
+        return {mac_address: DeviceRef(user_id, id) for mac_address, user_id, id in cursor.fetchall()}
+
+    try:
+        return await run_query(select, prepared=True)
+    except Exception as e:
+        logger.error(f"Retrieving devices by MAC address failed: {e}")
+        raise
+
+
+async def get_all_device_refs() -> Dict[str, DeviceRef]:
+    """Retrieve the owning user and row ID of every registered device, keyed by MAC address"""
+
+    def select(cursor):
+        cursor.execute("SELECT mac_address, user_id, id FROM devices")
+        return {mac_address: DeviceRef(user_id, id) for mac_address, user_id, id in cursor.fetchall()}
+
+    try:
+        return await run_query(select)
+    except Exception as e:
+        logger.error(f"Retrieving device registry failed: {e}")
+        raise
+
+
+async def add_sensorData_batch(readings: list) -> int:
+    """
+    Store many sensor readings with one multi-row INSERT in a single transaction.
+    Each reading is a (user_id, device_id, temperature, pressure, temperature_unit,
+    pressure_unit, timestamp) tuple.
+    """
+
+    if not readings:
+        return 0
+
+    def insert(cursor):
+        cursor.executemany(
             """
-            SELECT * FROM devices WHERE mac_address = %s
+            INSERT INTO sensordata (user_id, device_id, temperature, pressure, 
+                                   temperature_unit, pressure_unit, timestamp) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
             """,
-            (mac_address,)
+            readings
         )
-        device = cursor.fetchone()
-        
-        if device:
-            device['created_at'] = device['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return device
+        _update_rollups(cursor, readings)
+        return len(readings)
+
+    try:
+        return await run_query(insert, transaction=True)
     except Exception as e:
-        logger.error(f"Retrieving device by MAC address failed: {e}")
+        logger.error(f"Batch sensor data creation failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-async def get_sensorData(user_id: int, device_id: str, time_start: str, time_end: str) -> list:
-    """Retrieve sensor data from database"""
+# SQL aggregate for each supported bucket aggregation; "last" is handled with a window function
+SENSOR_AGGREGATES = {"avg": "AVG", "min": "MIN", "max": "MAX", "last": None}
+
+# The same aggregates computed from rollup columns
+ROLLUP_AGGREGATES = {
+    "avg": ("SUM(temperature_sum) / SUM(sample_count)", "SUM(pressure_sum) / SUM(sample_count)"),
+    "min": ("MIN(temperature_min)", "MIN(pressure_min)"),
+    "max": ("MAX(temperature_max)", "MAX(pressure_max)"),
+}
+
+
+def _epoch_seconds(column: str) -> str:
+    return f"TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', {column})"
+
+
+def _bucket_query(source: str, agg: str) -> str:
+    """Build the bucketed query for sensordata or one of its rollup tables"""
+
+    rollup = source in SENSOR_ROLLUPS
+    time_column = "bucket_start" if rollup else "timestamp"
+    # Bucket starts come back as epoch seconds; unlike UNIX_TIMESTAMP(), TIMESTAMPDIFF
+    # does not depend on the session time zone, so they line up with the rollups
+    bucket = f"{_epoch_seconds(time_column)} DIV %s * %s"
+    # A rollup row covers its whole bucket, so include the one containing time_start
+    width = SENSOR_ROLLUPS.get(source)
+    start = f"TIMESTAMP('1970-01-01 00:00:00') + INTERVAL ({_epoch_seconds('%s')} DIV {width} * {width}) SECOND" if rollup else "%s"
+    where = f"""
+            WHERE user_id = %s
+            AND device_id = %s
+            AND {time_column} BETWEEN {start} AND %s
+    """
+
+    if agg != "last":
+        if rollup:
+            temperature, pressure = ROLLUP_AGGREGATES[agg]
+            units, count = "MIN(temperature_unit), MIN(pressure_unit)", "CAST(SUM(sample_count) AS SIGNED)"
+        else:
+            func = SENSOR_AGGREGATES[agg]
+            temperature, pressure = f"{func}(temperature)", f"{func}(pressure)"
+            units, count = "MIN(temperature_unit), MIN(pressure_unit)", "COUNT(*)"
+        return f"""
+            SELECT {bucket} AS bucket, {temperature}, {pressure}, {units}, {count}
+            FROM {source}
+            {where}
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+
+    if rollup:
+        columns = "last_timestamp AS ts, temperature_last AS temperature, pressure_last AS pressure, sample_count AS n"
+        count = "CAST(SUM(n) OVER (PARTITION BY bucket) AS SIGNED)"
+    else:
+        columns = "timestamp AS ts, temperature, pressure, 1 AS n"
+        count = "COUNT(*) OVER (PARTITION BY bucket)"
+    return f"""
+        SELECT bucket, temperature, pressure, temperature_unit, pressure_unit, total
+        FROM (
+            SELECT bucketed.*,
+                   ROW_NUMBER() OVER (PARTITION BY bucket ORDER BY ts DESC) AS rn,
+                   {count} AS total
+            FROM (
+                SELECT {bucket} AS bucket, {columns}, temperature_unit, pressure_unit
+                FROM {source}
+                {where}
+            ) bucketed
+        ) ranked
+        WHERE rn = 1
+        ORDER BY bucket
+    """
+
+
+def sensor_source_for(bucket_seconds: int) -> str:
+    """Pick the coarsest table whose granularity evenly divides the bucket width"""
+
+    for table, width in reversed(list(SENSOR_ROLLUPS.items())):
+        if bucket_seconds % width == 0:
+            return table
+    return "sensordata"
+
+
+async def get_sensorData_buckets(user_id: int, device_id: int, time_start: str, time_end: str, bucket_seconds: int, agg: str = "avg") -> SensorSeries:
+    """
+    Retrieve sensor data aggregated into fixed time buckets, reading from the
+    coarsest rollup table that can serve the bucket width. Sub-minute buckets
+    over a range that reaches into the archive are computed from the merged raw
+    readings instead. The result is a bucketed SensorSeries whose timestamps
+    are bucket starts.
+    """
+
+    if agg not in SENSOR_AGGREGATES:
+        raise ValueError(f"Unsupported aggregation: {agg}")
+
+    source = sensor_source_for(bucket_seconds)
+    if source == "sensordata" and _archive is not None and _archive.may_contain(datetime.datetime.fromisoformat(time_start)):
+        # Rollups outlive archiving, but raw readings of archived months are only on disk
+        series = await get_sensorData(user_id, device_id, time_start, time_end)
+        return series.aggregate(bucket_seconds, agg)
+
+    query = _bucket_query(source, agg)
+    params = (bucket_seconds, bucket_seconds, user_id, device_id, time_start, time_end)
+
+    def select(cursor):
+        cursor.execute(query, params)
+        return SensorSeries.from_rows(cursor.fetchall(), bucketed=True)
 
-    connection = None
-    cursor = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
+        return await run_query(select)
+    except Exception as e:
+        logger.error(f"Retrieving aggregated sensor data failed: {e}")
+        raise
+
+
+async def get_latest_sensor_timestamp(user_id: int, device_id: int) -> Optional[datetime.datetime]:
+    """Retrieve the newest reading time for a device; a single index probe"""
+
+    def select(cursor):
         cursor.execute(
             """
-            SELECT timestamp, temperature, pressure, temperature_unit, pressure_unit
+            SELECT MAX(timestamp)
             FROM sensordata
-            WHERE timestamp BETWEEN %s AND %s
-            AND user_id = %s
-            AND device_id = %s
-            ORDER BY timestamp
+            WHERE user_id = %s AND device_id = %s
             """,
-            (time_start, time_end, user_id, device_id)
+            (user_id, device_id)
         )
-        return cursor.fetchall()
-    
+        return cursor.fetchone()[0]
+
+    try:
+        return await run_query(select)
     except Exception as e:
-        logger.error(f"Retrieving sensor data failed: {e}")
+        logger.error(f"Retrieving latest sensor timestamp failed: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
\ No newline at end of file
+
+
+def _open_stream(connection, query: str, params: tuple):
+    """Execute a query on an unbuffered cursor so rows stay on the server until fetched"""
+
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(query, params)
+    except Exception:
+        cursor.close()
+        raise
+    return cursor
+
+
+async def get_retention_policies() -> Dict[int, int]:
+    """Retrieve every per-user retention policy as user_id -> retention_days"""
+
+    def select(cursor):
+        cursor.execute("SELECT user_id, retention_days FROM retention_policies")
+        return dict(cursor.fetchall())
+
+    try:
+        return await run_query(select)
+    except Exception as e:
+        logger.error(f"Retrieving retention policies failed: {e}")
+        raise
+
+
+async def get_retention_policy(user_id: int) -> Optional[int]:
+    """Retrieve a user's retention in days, or None if they use the default"""
+
+    def select(cursor):
+        cursor.execute("SELECT retention_days FROM retention_policies WHERE user_id = %s", (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    try:
+        return await run_query(select)
+    except Exception as e:
+        logger.error(f"Retrieving retention policy failed: {e}")
+        raise
+
+
+async def set_retention_policy(user_id: int, retention_days: Optional[int]) -> bool:
+    """Set a user's retention in days (0 keeps readings forever); None reverts to the default"""
+
+    def upsert(cursor):
+        if retention_days is None:
+            cursor.execute("DELETE FROM retention_policies WHERE user_id = %s", (user_id,))
+        else:
+            cursor.execute(
+                """
+                INSERT INTO retention_policies (user_id, retention_days) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE retention_days = VALUES(retention_days)
+                """,
+                (user_id, retention_days)
+            )
+        return True
+
+    try:
+        return await run_query(upsert)
+    except Exception as e:
+        logger.error(f"Setting retention policy failed: {e}")
+        raise
+
+
+async def maintain_sensor_storage(now: datetime.datetime, plan: RetentionPlan, months_ahead: int, batch_size: int) -> Optional[dict]:
+    """
+    Pre-create future sensordata partitions and apply a retention plan, to
+    sensordata, its rollups and the archive, then move months past the
+    archive cutoff into the archive. Returns None without doing anything if
+    another replica is already running maintenance.
+    """
+
+    def maintain(cursor):
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (MAINTENANCE_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            return None
+
+        try:
+            added = add_future_partitions(cursor, now, months_ahead)
+            dropped, deleted = [], 0
+            if plan.partition_cutoff is not None:
+                expired = expired_partitions(cursor, plan.partition_cutoff)
+                dropped = drop_partitions(cursor, expired)
+                if expired:
+                    # Rollups are not partitioned; trim them once per dropped month, not every run
+                    for table in SENSOR_ROLLUPS:
+                        deleted += delete_rows_before(cursor, table, "bucket_start", expired[-1].less_than, batch_size=batch_size)
+            for delete in plan.deletes:
+                for table, time_column in [(PARTITIONED_TABLE, "timestamp")] + [(table, "bucket_start") for table in SENSOR_ROLLUPS]:
+                    deleted += delete_rows_before(cursor, table, time_column, *delete, batch_size=batch_size)
+
+            archived = []
+            if _archive is not None:
+                if plan.partition_cutoff is not None:
+                    _archive.expire(plan.partition_cutoff)
+                for delete in plan.deletes:
+                    _archive.expire(*delete)
+                if plan.archive_cutoff is not None:
+                    # Rollups stay in MySQL, so bucketed reads still cover archived months
+                    for partition in expired_partitions(cursor, plan.archive_cutoff):
+                        _archive.archive_partition(cursor, partition)
+                        archived += drop_partitions(cursor, [partition])
+            return {"added": added, "dropped": dropped, "archived": archived, "deleted": deleted}
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MAINTENANCE_LOCK,))
+            cursor.fetchone()
+
+    try:
+        return await run_query(maintain)
+    except Exception as e:
+        logger.error(f"Sensor storage maintenance failed: {e}")
+        raise
+
+
+def _fetch_series(cursor, size: int) -> Optional[SensorSeries]:
+    """Read up to size rows from a streaming cursor as a SensorSeries; None once exhausted"""
+
+    rows = cursor.fetchmany(size)
+    return SensorSeries.from_rows(rows) if rows else None
+
+
+async def iter_sensorData(user_id: int, device_id: int, time_start: str, time_end: str, chunk_size: int = 5000):
+    """
+    Stream sensor data as SensorSeries chunks of at most chunk_size rows using
+    a server-side (unbuffered) cursor, so memory use does not grow with the
+    size of the range. Holds one pooled connection until the iteration
+    finishes or is closed. Archived readings, if any, come first.
+    """
+
+    if _archive is not None:
+        # Read a day at a time, so archived months do not undo the constant memory use
+        async for cold in _archive.stream(user_id, device_id, datetime.datetime.fromisoformat(time_start), datetime.datetime.fromisoformat(time_end)):
+            for start in range(0, len(cold), chunk_size):
+                yield cold.slice(start, start + chunk_size)
+
+    pool = get_db_pool()
+    connection = await pool.acquire()
+    try:
+        cursor = await pool.run(_open_stream, connection, SENSOR_RANGE_SQL, (time_start, time_end, user_id, device_id))
+        while True:
+            series = await pool.run(_fetch_series, cursor, chunk_size)
+            if series is None:
+                break
+            yield series
+        await pool.run(cursor.close)
+    except asyncio.CancelledError:
+        # A worker thread may still be reading from the connection
+        await pool.abandon(connection)
+        raise
+    except BaseException as e:
+        # Closed early (client went away) or failed: unread rows make the connection unusable
+        if not isinstance(e, GeneratorExit):
+            logger.error(f"Streaming sensor data failed: {e}")
+        await pool.release(connection, discard=True)
+        raise
+    else:
+        await pool.release(connection)
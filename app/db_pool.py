@@ -0,0 +1,318 @@
+import time
+import random
+import asyncio
+import logging
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+from contextlib import asynccontextmanager
+
+from app.executor import BoundedExecutor, Overloaded
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    """Bookkeeping for a single pooled connection"""
+
+    __slots__ = ("connection", "created_at", "last_used", "cache")
+
+    def __init__(self, connection: Any):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+        self.cache: Dict[str, Any] = {}  # per-connection state (prepared statements) that dies with it
+
+
+class ConnectionPool:
+    """
+    Bounded pool of blocking MySQL connections with an async API.
+
+    Pool bookkeeping happens on the event loop; every call that touches the
+    network (connect, ping, queries, close) runs on a dedicated bounded
+    executor sized to the maximum number of connections, so a query never
+    waits for a worker thread while holding a connection. Failed connects are
+    retried with jittered exponential backoff on the loop, and once max_waiters
+    callers are already queued for a connection, acquire() raises Overloaded.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 2,
+        max_size: int = 10,
+        max_idle: float = 300.0,  # close idle connections above min_size after 5 minutes
+        max_lifetime: float = 3600.0,  # recycle every connection after an hour
+        health_check_interval: float = 30.0,  # ping connections idle longer than this
+        acquire_timeout: float = 10.0,
+        disconnect_errors: tuple = (),
+        max_waiters: int = 100,
+        connect_retries: int = 12,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 10.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds: min_size={min_size}, max_size={max_size}")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.disconnect_errors = disconnect_errors
+        self.max_waiters = max_waiters
+        self.connect_retries = connect_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        # Room for a connect or close per slot besides the queries themselves
+        self.executor = BoundedExecutor("mysql-pool", max_workers=max_size, max_queue=max_size * 2)
+        self._waiters = 0
+        self.connect_failures = 0
+        self._idle: Deque[_Slot] = deque()
+        self._in_use: Dict[int, _Slot] = {}
+        self._size = 0
+        self._cond = asyncio.Condition()
+        self._closed = False
+        self._reaper: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        """Return a snapshot of pool usage"""
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "waiters": self._waiters,
+            "connect_failures": self.connect_failures,
+            "executor": self.executor.stats(),
+        }
+
+    def connection_cache(self, connection: Any) -> Dict[str, Any]:
+        """
+        State owned by the caller that lives exactly as long as a checked-out
+        connection, such as its prepared statements. Only the holder of the
+        connection may touch it.
+        """
+        return self._in_use[id(connection)].cache
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the pool's executor"""
+        return await self.executor.run(func, *args, **kwargs)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform in [0, min(max, base * 2^attempt)]"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    async def _open_connection(self, deadline: Optional[float] = None) -> Any:
+        """Connect on the executor, retrying without blocking the loop until retries or the deadline run out"""
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                return await self.run(self._connect)
+            except Overloaded:
+                raise
+            except Exception as e:
+                self.connect_failures += 1
+                attempt += 1
+                delay = self._backoff(attempt)
+                out_of_time = deadline is not None and loop.time() + delay >= deadline
+                if attempt >= self.connect_retries or out_of_time:
+                    raise
+                logger.warning(
+                    f"Connection attempt {attempt}/{self.connect_retries} failed: {e}. "
+                    f"Retrying in {delay:.2f} seconds..."
+                )
+                await asyncio.sleep(delay)
+
+    async def open(self):
+        """Open min_size connections and start the idle reaper"""
+        for _ in range(self.min_size):
+            connection = await self._open_connection()
+            self._size += 1
+            self._idle.append(_Slot(connection))
+        self._reaper = asyncio.create_task(self._reap_forever())
+        logger.info(f"Connection pool opened with {self._size} connections (max {self.max_size})")
+
+    async def close(self):
+        """Close all idle connections and stop handing out new ones"""
+        self._closed = True
+        if self._reaper:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+
+        async with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for slot in idle:
+            await self.run(self._close_quietly, slot.connection)
+        self.executor.shutdown()
+        logger.info("Connection pool closed")
+
+    async def acquire(self) -> Any:
+        """Check out a healthy connection, opening a new one if below max_size"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout
+
+        while True:
+            slot = None
+            if not self._idle and self._size >= self.max_size and self._waiters >= self.max_waiters:
+                raise Overloaded(f"{self._waiters} requests already waiting for a database connection")
+            async with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        slot = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(
+                            f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+                        )
+                    self._waiters += 1
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    finally:
+                        self._waiters -= 1
+
+            if slot is None:
+                try:
+                    slot = _Slot(await self._open_connection(deadline))
+                except Exception:
+                    await self._forget()
+                    raise
+            elif not await self._is_healthy(slot):
+                await self.run(self._close_quietly, slot.connection)
+                await self._forget()
+                continue
+
+            self._in_use[id(slot.connection)] = slot
+            return slot.connection
+
+    async def release(self, connection: Any, discard: bool = False):
+        """Return a connection to the pool, or close it if discard is set"""
+        slot = self._in_use.pop(id(connection), None)
+        if slot is None:
+            return
+
+        now = time.monotonic()
+        if discard or self._closed or now - slot.created_at >= self.max_lifetime:
+            await self.run(self._close_quietly, connection)
+            await self._forget()
+            return
+
+        slot.last_used = now
+        async with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        """Acquire a connection for the duration of the block"""
+        connection = await self.acquire()
+        try:
+            yield connection
+        except asyncio.CancelledError:
+            # The worker thread may still be using the connection, so it can
+            # neither be reused nor safely closed from here
+            await self.abandon(connection)
+            raise
+        except self.disconnect_errors:
+            await self.release(connection, discard=True)
+            raise
+        except BaseException:
+            await self.release(connection)
+            raise
+        else:
+            await self.release(connection)
+
+    async def abandon(self, connection: Any):
+        """Drop a connection from the pool without touching it"""
+        if self._in_use.pop(id(connection), None) is not None:
+            await self._forget()
+
+    async def _forget(self):
+        async with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    async def _is_healthy(self, slot: _Slot) -> bool:
+        now = time.monotonic()
+        if now - slot.created_at >= self.max_lifetime:
+            return False
+        if now - slot.last_used < self.health_check_interval:
+            return True
+        try:
+            await self.run(slot.connection.ping, reconnect=False)
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    async def _reap_forever(self):
+        interval = max(1.0, min(self.max_idle, self.health_check_interval))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._reap()
+            except Exception as e:
+                logger.warning(f"Connection pool maintenance failed: {e}")
+
+    async def _reap(self):
+        """Close idle connections past max_idle/max_lifetime, then refill to min_size"""
+        now = time.monotonic()
+        expired = []
+        async with self._cond:
+            keep: Deque[_Slot] = deque()
+            for slot in self._idle:
+                too_old = now - slot.created_at >= self.max_lifetime
+                too_idle = now - slot.last_used >= self.max_idle
+                if too_old or (too_idle and self._size - len(expired) > self.min_size):
+                    expired.append(slot)
+                else:
+                    keep.append(slot)
+            self._idle = keep
+            self._size -= len(expired)
+
+        for slot in expired:
+            await self.run(self._close_quietly, slot.connection)
+
+        while not self._closed and self._size < self.min_size:
+            async with self._cond:
+                self._size += 1
+            try:
+                slot = _Slot(await self._open_connection())
+            except Exception:
+                await self._forget()
+                raise
+            async with self._cond:
+                self._idle.append(slot)
+                self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(connection: Any):
+        try:
+            connection.close()
+        except Exception:
+            pass
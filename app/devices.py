@@ -0,0 +1,128 @@
+import asyncio
+import logging
+
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from app.cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceRef(NamedTuple):
+    """What ingest needs to know about a device: its owner and devices.id"""
+
+    user_id: int
+    id: int
+
+
+class DeviceRegistry:
+    """
+    In-memory MAC address -> DeviceRef map for the sensor ingest path.
+
+    Warmed with every device at startup and reloaded every refresh_interval
+    seconds, so devices added or removed through another replica are picked
+    up. MACs that are not registered are remembered for negative_ttl seconds
+    so a misconfigured sensor cannot turn every post into a query.
+
+    A MAC forgotten while a load is in flight is left out of that load's
+    result, so a snapshot read before a device was removed cannot restore it.
+    """
+
+    def __init__(
+        self,
+        load_all: Callable[[], Awaitable[Dict[str, DeviceRef]]],
+        load_some: Callable[[list], Awaitable[Dict[str, DeviceRef]]],
+        refresh_interval: float = 300,
+        negative_ttl: float = 30,
+        negative_cache_size: int = 10000,
+    ):
+        self._load_all = load_all
+        self._load_some = load_some
+        self.refresh_interval = refresh_interval
+        self._devices: Dict[str, DeviceRef] = {}
+        self._unknown = TTLCache(maxsize=negative_cache_size, ttl=negative_ttl)
+        self._flights = SingleFlight()
+        # One set per load in flight, collecting the MACs forgotten meanwhile
+        self._forgotten: List[Set[str]] = []
+        self.loads = 0
+        self.queries = 0
+
+    async def warm(self):
+        """Replace the map with every registered device"""
+        forgotten = set()
+        self._forgotten.append(forgotten)
+        try:
+            devices = await self._load_all()
+        finally:
+            self._forgotten.remove(forgotten)
+        for mac_address in forgotten:
+            devices.pop(mac_address, None)
+        self._devices = devices
+        self._unknown.clear()
+        self.loads += 1
+        logger.info(f"Device registry loaded {len(devices)} devices")
+
+    async def refresh_forever(self):
+        """Reload the whole map periodically; run as a background task"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.warm()
+            except Exception as e:
+                logger.warning(f"Device registry refresh failed: {e}")
+
+    async def lookup(self, mac_address: str) -> Optional[DeviceRef]:
+        """The device registered to a MAC address, or None"""
+        device = self._devices.get(mac_address)
+        if device is not None or mac_address in self._unknown:
+            return device
+        found, _ = await self._flights.run(mac_address, lambda: self._query([mac_address]))
+        return found.get(mac_address)
+
+    async def lookup_many(self, mac_addresses: Iterable[str]) -> Dict[str, DeviceRef]:
+        """Resolve several MAC addresses with at most one query; unknown ones are left out"""
+        found = {}
+        missing = []
+        for mac_address in set(mac_addresses):
+            device = self._devices.get(mac_address)
+            if device is not None:
+                found[mac_address] = device
+            elif mac_address not in self._unknown:
+                missing.append(mac_address)
+        if missing:
+            found.update(await self._query(missing))
+        return found
+
+    def forget(self, mac_address: str):
+        """Drop anything known about a MAC; call after a device is added or removed"""
+        self._devices.pop(mac_address, None)
+        self._unknown.pop(mac_address)
+        for forgotten in self._forgotten:
+            forgotten.add(mac_address)
+
+    async def _query(self, mac_addresses: list) -> Dict[str, DeviceRef]:
+        self.queries += 1
+        forgotten = set()
+        self._forgotten.append(forgotten)
+        try:
+            found = await self._load_some(mac_addresses)
+        finally:
+            self._forgotten.remove(forgotten)
+        for mac_address in mac_addresses:
+            if mac_address in forgotten:
+                continue
+            device = found.get(mac_address)
+            if device is None:
+                self._unknown.set(mac_address, True)
+            else:
+                self._devices[mac_address] = device
+        return found
+
+    def stats(self) -> dict:
+        """Return map size, negative cache counters and query counts"""
+        return {
+            "devices": len(self._devices),
+            "unknown": self._unknown.stats(),
+            "loads": self.loads,
+            "queries": self.queries,
+        }
@@ -0,0 +1,110 @@
+import time
+import asyncio
+
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing more blocking work than a limit allows; maps to 503"""
+
+
+def _notify(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+    """Schedule bookkeeping on the loop from a worker thread; a closed loop means shutdown"""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+
+
+class BoundedExecutor:
+    """
+    Thread pool for blocking calls (MySQL, file reads) made from async code.
+
+    At most max_workers calls run at once and at most max_queue more wait for
+    a thread; beyond that run() raises Overloaded immediately rather than
+    letting latency grow without bound. Queue wait and run times are tracked
+    for /api/metrics.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 100):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+        self.pending = 0  # submitted and not yet finished
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_pending = 0
+        self._total_wait = 0.0
+        self.max_wait = 0.0
+        self._total_run = 0.0
+
+    @property
+    def queued(self) -> int:
+        return self.pending - self.running
+
+    def saturated(self) -> bool:
+        return self.queued >= self.max_queue
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on a worker thread, or raise Overloaded if the queue is full"""
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{self.name} executor is saturated ({self.pending} calls pending)")
+
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+
+        def call():
+            started = time.perf_counter()
+            _notify(loop, self._started, started - submitted)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _notify(loop, self._finished, time.perf_counter() - started)
+
+        # pending is released when the thread is done (or the call is cancelled
+        # before it starts), not when the awaiting coroutine gives up
+        future = self._executor.submit(call)
+        future.add_done_callback(lambda done: _notify(loop, self._done, done))
+        return await asyncio.wrap_future(future)
+
+    def _started(self, waited: float):
+        self.running += 1
+        self._total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _finished(self, elapsed: float):
+        self.running -= 1
+        self.completed += 1
+        self._total_run += elapsed
+
+    def _done(self, future):
+        self.pending -= 1
+        if not future.cancelled() and future.exception() is not None:
+            self.failed += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """Return concurrency, queue depth, rejection and latency counters"""
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._total_wait / self.completed * 1000, 3) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "avg_run_ms": round(self._total_run / self.completed * 1000, 3) if self.completed else 0.0,
+        }
@@ -0,0 +1,181 @@
+import time
+import asyncio
+import logging
+
+from typing import Awaitable, Callable, List, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the queue during shutdown
+_STOP = object()
+
+
+class IngestBuffer:
+    """
+    Write-behind queue for sensor readings.
+
+    Readings are enqueued by request handlers and written by a single background
+    task as one multi-row insert once max_batch rows are waiting or the oldest
+    waiting row is max_delay seconds old. A full queue pushes back on producers
+    instead of growing without bound.
+
+    Errors in transient_errors (lost connections, an overloaded pool) are
+    retried up to max_retries times before the batch is dropped. Any other
+    error is blamed on the data: the batch is split in half and each half
+    written separately, so only the readings that fail alone are lost.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list], Awaitable[int]],
+        max_batch: int = 500,
+        max_delay: float = 0.2,
+        max_queue: int = 10000,
+        enqueue_timeout: float = 1.0,
+        max_retries: int = 3,
+        transient_errors: Tuple[Type[BaseException], ...] = (),
+        on_flush: Optional[Callable[[list], None]] = None,
+    ):
+        self._flush_func = flush
+        self._on_flush = on_flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.transient_errors = transient_errors
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.rows_enqueued = 0
+        self.rows_flushed = 0
+        self.rows_dropped = 0
+        self.rows_rejected = 0
+        self.flushes = 0
+        self.batches_split = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    async def start(self):
+        """Start the background flush task"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Ingest buffer started (batch {self.max_batch}, delay {self.max_delay}s, queue {self.max_queue})")
+
+    async def stop(self):
+        """Stop accepting readings and flush everything already queued"""
+        if self._task is None:
+            return
+        self._closed = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"Ingest buffer drained ({self.rows_flushed} rows flushed, {self.rows_dropped} dropped)")
+
+    async def put(self, row: tuple) -> bool:
+        """Queue one reading; returns False if the queue stayed full for enqueue_timeout"""
+        if self._closed or self._queue is None:
+            self.rows_rejected += 1
+            return False
+        try:
+            await asyncio.wait_for(self._queue.put(row), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rows_rejected += 1
+            return False
+        self.rows_enqueued += 1
+        return True
+
+    def stats(self) -> dict:
+        """Return queue depth, throughput and flush latency counters"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "rows_enqueued": self.rows_enqueued,
+            "rows_flushed": self.rows_flushed,
+            "rows_dropped": self.rows_dropped,
+            "rows_rejected": self.rows_rejected,
+            "flushes": self.flushes,
+            "batches_split": self.batches_split,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[tuple] = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining > 0:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        error = await self._write(batch)
+        if error is None:
+            return
+
+        if len(batch) == 1 or isinstance(error, self.transient_errors):
+            self.rows_dropped += len(batch)
+            logger.error(f"Dropped {len(batch)} sensor readings after failed flush: {error}")
+            return
+
+        # One bad reading fails the whole statement; split the batch so only the
+        # readings that fail on their own are dropped
+        self.batches_split += 1
+        middle = len(batch) // 2
+        await self._flush(batch[:middle])
+        await self._flush(batch[middle:])
+
+    async def _write(self, batch: list) -> Optional[Exception]:
+        """Write a batch, retrying transient errors; returns the last error, or None once written"""
+        error = None
+        for attempt in range(1, self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self._flush_func(batch)
+            except Exception as e:
+                error = e
+                logger.warning(f"Ingest flush of {len(batch)} rows failed (attempt {attempt}/{self.max_retries}): {e}")
+                if not isinstance(e, self.transient_errors):
+                    return error
+                if attempt < self.max_retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+                continue
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+            if self._on_flush is not None:
+                try:
+                    self._on_flush(batch)
+                except Exception as e:
+                    logger.warning(f"Ingest flush callback failed: {e}")
+            return None
+
+        return error
@@ -1,37 +1,82 @@
 import uvicorn
 from fastapi import FastAPI, Request, Response, HTTPException, status, Form, Body, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+import re
+import math
 import uuid
+import asyncio
+import orjson
+import hmac
+import hashlib
 import datetime
-from typing import Dict, Optional
+from typing import Any, List, Optional
 from contextlib import asynccontextmanager
-from fastapi.staticfiles import StaticFiles
 import mysql.connector as mysql
 import os
 from dotenv import load_dotenv
-import httpx
+
+from app.cache import TTLCache
+from app.ingest import IngestBuffer
+from app.pubsub import SensorBroker
+from app.templates import TemplateCache
+from app.assets import AssetManifest, HashedStaticFiles
+from app.compression import CompressionMiddleware
+from app.ai import AIClient
+from app.devices import DeviceRegistry
+from app.executor import BoundedExecutor, Overloaded
+from app.archive import SensorArchive
+from app.retention import SensorRetention
+from app.weather import WeatherService
+from app.serialization import FastJSONResponse, TIMESTAMP_FORMAT, dumps
+from app.sensor_formats import (
+    ARROW_MEDIA_TYPE,
+    PARQUET_MEDIA_TYPE,
+    EXPORT_MEDIA_TYPES,
+    SENSOR_SCHEMA,
+    BUCKET_SCHEMA,
+    arrow_stream,
+    parquet_bytes,
+    csv_chunk,
+    csv_header,
+    columnar_json,
+    ndjson_chunk,
+    records_json
+)
 
 # Import database functions
 from app.database import (
+    init_db_pool,
+    close_db_pool,
+    set_sensor_archive,
+    get_db_pool,
     setup_database,
     get_user_by_email,
-    get_user_by_id,
     create_user,
     create_session,
-    get_session,
+    get_session_user,
     delete_session,
     add_device,
     remove_device,
     get_devices,
     get_device,
     add_sensorData,
-    get_device_by_mac_address,
     get_sensorData,
+    get_sensorData_buckets,
+    get_latest_sensor_timestamp,
+    iter_sensorData,
+    SENSOR_AGGREGATES,
+    get_devices_by_mac_addresses,
+    get_all_device_refs,
+    add_sensorData_batch,
     add_clothing,
     get_clothing,
     remove_clothing,
     update_clothing,
-    get_wardrobe
+    get_wardrobe,
+    get_retention_policies,
+    get_retention_policy,
+    set_retention_policy,
+    maintain_sensor_storage
 )
 
 # Load enviromental variables
@@ -42,6 +87,124 @@ db_user = os.getenv('MYSQL_USER')
 db_pass = os.getenv('MYSQL_PASSWORD')
 db_name = os.getenv('MYSQL_DATABASE')
 
+# Blocking file reads (templates, static asset fingerprinting) run here, off the event loop
+file_executor = BoundedExecutor(
+    "file-io",
+    max_workers=int(os.getenv('FILE_IO_WORKERS', '4')),
+    max_queue=int(os.getenv('FILE_IO_QUEUE', '64')),
+)
+
+# HTML pages, loaded once in lifespan; APP_ENV=development also watches for edits
+# and leaves asset names unhashed so edited CSS/JS is picked up without a restart
+STATIC_DIR = "app/static"
+TEMPLATE_DIR = "app/static/templates"
+DEVELOPMENT = os.getenv('APP_ENV', 'production') == 'development'
+assets = AssetManifest(STATIC_DIR, exclude=("templates",))
+templates = TemplateCache(TEMPLATE_DIR, reload=DEVELOPMENT, transform=assets.rewrite)
+
+# Parts of device timestamps that datetime.fromisoformat() on Python 3.9 rejects
+TIMESTAMP_FRACTION = re.compile(r"\.(\d+)")
+TIMESTAMP_OFFSET = re.compile(r"[Zz]$|([+-]\d{2}):?(\d{2})$")
+
+# Width of the sensordata unit columns (VARCHAR(50))
+MAX_UNIT_LENGTH = 50
+
+# Upper bound on readings accepted by a single batch ingest request
+MAX_BATCH_READINGS = int(os.getenv('MAX_BATCH_READINGS', '5000'))
+
+# Downsampling: bucket widths the sensor endpoint snaps to, and the point cap
+BUCKET_SIZES = [1, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400]
+DEFAULT_MAX_POINTS = 1000
+MAX_POINTS_LIMIT = 10000
+RESOLUTION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Optional write-behind mode for single-reading ingest, started in lifespan
+SENSOR_WRITE_BEHIND = os.getenv('SENSOR_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+ingest_buffer: Optional[IngestBuffer] = None
+
+# Live readings keyed by (user_id, device row id), fed after each reading is stored
+sensor_broker = SensorBroker(queue_size=int(os.getenv('SENSOR_STREAM_QUEUE_SIZE', '100')))
+SENSOR_STREAM_HEARTBEAT = float(os.getenv('SENSOR_STREAM_HEARTBEAT', '15'))
+
+# Rows fetched from the server-side cursor per streamed chunk
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000'))
+
+# Compression of /api responses; encodings in order of preference, skipped if not installed
+COMPRESSION_ENCODINGS = [coding.strip() for coding in os.getenv('COMPRESSION_ENCODINGS', 'br,zstd,gzip').split(',') if coding.strip()]
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_LEVELS = {
+    "br": int(os.getenv('BROTLI_LEVEL', '4')),
+    "zstd": int(os.getenv('ZSTD_LEVEL', '3')),
+    "gzip": int(os.getenv('GZIP_LEVEL', '6')),
+}
+
+# Bearer token for /api/metrics; the route is disabled when it is not set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Session token -> {"user": ..., "expires_at": ...}; entries never outlive the session
+session_cache = TTLCache(
+    maxsize=int(os.getenv('SESSION_CACHE_SIZE', '4096')),
+    ttl=float(os.getenv('SESSION_CACHE_TTL', '60')),
+)
+
+# Upstream AI completions over one shared client, opened in lifespan
+ai_client = AIClient(
+    os.getenv('AI_API_URL', "https://ece140-wi25-api.frosty-sky-f43d.workers.dev/api/v1/ai/complete"),
+    headers={'email': os.getenv('UCSD_EMAIL'), 'pid': os.getenv('UCSD_PID')},
+    cache_size=int(os.getenv('AI_CACHE_SIZE', '256')),
+    cache_ttl=float(os.getenv('AI_CACHE_TTL', '600')),
+    max_connections=int(os.getenv('AI_MAX_CONNECTIONS', '20')),
+    max_keepalive=int(os.getenv('AI_MAX_KEEPALIVE', '10')),
+)
+
+# Weather for users' locations; the upstream URLs can point at a local stub
+weather_service = WeatherService(
+    geocode_url=os.getenv('GEOCODE_API_URL', "https://nominatim.openstreetmap.org/search"),
+    weather_url=os.getenv('WEATHER_API_URL', "https://api.weather.gov"),
+    user_agent=os.getenv('WEATHER_USER_AGENT', "ece140-wardrobe"),
+    forecast_ttl=float(os.getenv('WEATHER_FORECAST_TTL', '900')),
+    geocode_ttl=float(os.getenv('WEATHER_GEOCODE_TTL', '86400')),
+    geocode_cache_size=int(os.getenv('WEATHER_GEOCODE_CACHE_SIZE', '4096')),
+    negative_ttl=float(os.getenv('WEATHER_NEGATIVE_TTL', '300')),
+)
+
+# MAC address -> (user_id, devices.id) for sensor ingest, warmed in lifespan
+device_registry = DeviceRegistry(
+    get_all_device_refs,
+    get_devices_by_mac_addresses,
+    refresh_interval=float(os.getenv('DEVICE_REGISTRY_REFRESH', '300')),
+    negative_ttl=float(os.getenv('DEVICE_REGISTRY_NEGATIVE_TTL', '30')),
+)
+
+# Sensordata months older than SENSOR_ARCHIVE_AFTER_DAYS (0: never) are moved to
+# compressed files under SENSOR_ARCHIVE_DIR, which every replica must share
+sensor_archive = SensorArchive(
+    os.getenv('SENSOR_ARCHIVE_DIR', 'archive'),
+    after_days=int(os.getenv('SENSOR_ARCHIVE_AFTER_DAYS', '0')),
+    run=file_executor.run,
+)
+
+# Monthly sensordata partitions and retention; SENSOR_RETENTION_DAYS=0 keeps readings
+# forever unless a user has set a shorter policy of their own. Otherwise it is the
+# longest anyone may keep readings, and partitions older than it are dropped
+sensor_retention = SensorRetention(
+    maintain_sensor_storage,
+    get_retention_policies,
+    default_days=int(os.getenv('SENSOR_RETENTION_DAYS', '0')),
+    archive_days=sensor_archive.after_days,
+    months_ahead=int(os.getenv('SENSOR_PARTITION_MONTHS_AHEAD', '3')),
+    interval=float(os.getenv('SENSOR_RETENTION_INTERVAL', '3600')),
+    batch_size=int(os.getenv('SENSOR_RETENTION_BATCH_ROWS', '10000')),
+)
+
+# Outfit recommendations keyed by (user_id, wardrobe digest, weather bucket); the
+# digest is taken from the wardrobe rows themselves, so a change made through any
+# worker or replica stops the old answer being served
+recommendation_cache = TTLCache(
+    maxsize=int(os.getenv('RECOMMENDATION_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('RECOMMENDATION_CACHE_TTL', '3600')),
+)
+
 # Set up FastAPI app
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -50,28 +213,73 @@ async def lifespan(app: FastAPI):
     Handles database setup and cleanup in a more structured way.
     """
 
+    global ingest_buffer
+    template_watcher = None
+    registry_refresher = None
+    retention_task = None
+
     try:
+        if not DEVELOPMENT:
+            await file_executor.run(assets.build)
+        await file_executor.run(templates.load)
+        if templates.reload:
+            template_watcher = asyncio.create_task(templates.watch(run=file_executor.run))
+
+        await ai_client.start()
+        await weather_service.start()
+        await init_db_pool()
+        # Left detached while archiving is off and nothing was ever archived, so reads skip it
+        await file_executor.run(sensor_archive.scan)
+        if sensor_archive.enabled:
+            set_sensor_archive(sensor_archive)
         await setup_database() 
         print("Database setup completed")
+        retention_task = asyncio.create_task(sensor_retention.run_forever())
+
+        await device_registry.warm()
+        registry_refresher = asyncio.create_task(device_registry.refresh_forever())
+
+        if SENSOR_WRITE_BEHIND:
+            ingest_buffer = IngestBuffer(
+                add_sensorData_batch,
+                max_batch=int(os.getenv('SENSOR_FLUSH_ROWS', '500')),
+                max_delay=float(os.getenv('SENSOR_FLUSH_DELAY', '0.2')),
+                max_queue=int(os.getenv('SENSOR_QUEUE_SIZE', '10000')),
+                transient_errors=(mysql.errors.InterfaceError, mysql.errors.OperationalError, Overloaded, asyncio.TimeoutError),
+                on_flush=publish_sensor_readings,
+            )
+            await ingest_buffer.start()
         yield
     finally:
+        if template_watcher:
+            template_watcher.cancel()
+        if registry_refresher:
+            registry_refresher.cancel()
+        if retention_task:
+            retention_task.cancel()
+        if ingest_buffer:
+            await ingest_buffer.stop()
+            ingest_buffer = None
+        await close_db_pool()
+        await ai_client.close()
+        await weather_service.close()
+        file_executor.shutdown()
         print("Shutdown completed")
 
 
-app = FastAPI(lifespan=lifespan)
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded) -> FastJSONResponse:
+    """Shed load with a retryable 503 when a blocking-work queue is full"""
+    return FastJSONResponse(status_code=503, content={"error": str(exc)}, headers={"Retry-After": "1"})
 
-
-# Static file helper
-def read_html(file_path: str) -> str:
-    with open(file_path, "r") as f:
-        return f.read()
+app.add_middleware(CompressionMiddleware, encodings=COMPRESSION_ENCODINGS, levels=COMPRESSION_LEVELS, minimum_size=COMPRESSION_MIN_SIZE)
+app.mount("/static", HashedStaticFiles(directory=STATIC_DIR, manifest=assets), name="static")
 
 
 # Error page helper
-def get_error_html(username: str) -> str:
-    error_html = read_html("app/static/templates/error.html")
-    return error_html.replace("{username}", username)
+def get_error_html(username: str) -> bytes:
+    return templates.render("error.html", username=username)
 
 
 # Authentication
@@ -82,25 +290,35 @@ async def verify_session(request: Request):
     if not sessionId:
         return None
     
-    session = await get_session(sessionId)
-    if not session:
-        return None
+    session = session_cache.get(sessionId)
+    if session is None:
+        user = await get_session_user(sessionId)
+        if not user:
+            return None
+
+        session = {"user": user, "expires_at": user.session_expires_at}
+        remaining = (session["expires_at"] - datetime.datetime.now()).total_seconds()
+        session_cache.set(sessionId, session, ttl=remaining)
     
     session_exp = session["expires_at"]
     time_now = datetime.datetime.now()
     if time_now >= session_exp:
+        session_cache.pop(sessionId)
         return None
 
-    user = await get_user_by_id(session["user_id"])
-    return user
+    return session["user"]
+
+
+def invalidate_user_sessions(user_id: int):
+    """Drop every cached session of a user; call after any change to their user row"""
+    session_cache.discard_where(lambda token, session: session["user"]["id"] == user_id)
 
 
 #Home GET route
 @app.get("/", response_class=HTMLResponse)
-def get_index() -> HTMLResponse:
+def get_index(request: Request) -> Response:
    """Return the index HTML page"""
-   with open("app/static/templates/index.html") as html:
-       return HTMLResponse(content=html.read())
+   return templates.response(request, "index.html")
 
 
 #Dashboard GET route
@@ -112,8 +330,7 @@ async def get_dashboard(request: Request) -> HTMLResponse:
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
-    with open("app/static/templates/dashboard.html") as html:
-        return HTMLResponse(content=html.read())
+    return templates.response(request, "dashboard.html")
 
 
 #Profile routes
@@ -125,10 +342,10 @@ async def profile_page(request: Request):
 
     if not user:
        return RedirectResponse(url="/login", status_code=303)
-    return HTMLResponse(content=read_html("app/static/templates/profile.html"))
+    return templates.response(request, "profile.html")
 
-@app.get("/api/profile", response_class=JSONResponse)
-async def get_user_profile(request: Request) -> JSONResponse:
+@app.get("/api/profile", response_class=FastJSONResponse)
+async def get_user_profile(request: Request) -> FastJSONResponse:
     """Get profile information for the authenticated user"""
 
     user = await verify_session(request)
@@ -141,12 +358,76 @@ async def get_user_profile(request: Request) -> JSONResponse:
             "name": user["name"],
             "email": user["email"],
             "location": user["location"],
-            "created_at": user["created_at"].strftime('%Y-%m-%d %H:%M:%S')
+            "created_at": user["created_at"]
         }
-        return JSONResponse(user_info)
+        return FastJSONResponse(user_info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get user info: {str(e)}")
 
+@app.get("/api/profile/retention", response_class=FastJSONResponse)
+async def get_user_retention(request: Request) -> FastJSONResponse:
+    """How long the authenticated user's sensor readings are kept; 0 days means forever"""
+
+    user = await verify_session(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    try:
+        retention_days = await get_retention_policy(user["id"])
+        return FastJSONResponse({"retention_days": retention_days, "default_retention_days": sensor_retention.default_days})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get retention policy: {str(e)}")
+
+@app.put("/api/profile/retention", response_class=FastJSONResponse)
+async def update_user_retention(request: Request, retention_days: Optional[int] = Body(None, embed=True, ge=0)) -> FastJSONResponse:
+    """
+    Set how many days to keep the user's sensor readings; null reverts to the default.
+    Readings are never kept longer than the default, so 0 (forever) and anything above
+    it are only accepted when the default itself is to keep readings forever.
+    """
+
+    user = await verify_session(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    default_days = sensor_retention.default_days
+    if retention_days is not None and default_days > 0 and not 0 < retention_days <= default_days:
+        raise HTTPException(status_code=400, detail=f"retention_days must be between 1 and {default_days}")
+
+    try:
+        await set_retention_policy(user["id"], retention_days)
+        return FastJSONResponse({"success": True, "retention_days": retention_days})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to set retention policy: {str(e)}")
+
+
+async def get_user_weather(user: dict) -> dict:
+    """Cached weather for a user's profile location; raises HTTPException if there is none"""
+
+    location = user["location"]
+    if not location:
+        raise HTTPException(status_code=404, detail="No location set on profile")
+
+    try:
+        weather = await weather_service.current(location)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to get weather: {str(e)}")
+    if weather is None:
+        raise HTTPException(status_code=404, detail=f"Location not found: {location}")
+
+    return {"location": location, **weather}
+
+@app.get("/api/weather", response_class=FastJSONResponse)
+async def get_weather(request: Request) -> FastJSONResponse:
+    """Get current conditions and the next forecast period for the authenticated user's location"""
+
+    user = await verify_session(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    weather = await get_user_weather(user)
+    return FastJSONResponse(weather, headers={"Cache-Control": "private, max-age=300"})
+
 
 #Signup routes
 @app.get("/signup", response_class=HTMLResponse)
@@ -156,7 +437,7 @@ async def signup_page(request: Request):
     user = await verify_session(request)
     if user:
         return RedirectResponse(url=f"/profile", status_code=303)
-    return HTMLResponse(content=read_html("app/static/templates/signup.html"))
+    return templates.response(request, "signup.html")
 
 @app.post("/signup")
 async def signup(request: Request):
@@ -169,7 +450,7 @@ async def signup(request: Request):
     location = form_data.get("location", "")
     
     if not name or not email or not password:
-        return HTMLResponse(content=read_html("app/static/templates/signup.html"))
+        return templates.response(request, "signup.html")
     
     try:
         await create_user(name, email, password, location)
@@ -195,7 +476,7 @@ async def login_page(request: Request):
     user = await verify_session(request)
     if user:
         return RedirectResponse(url=f"/profile/", status_code=303)
-    return HTMLResponse(content=read_html("app/static/templates/login.html"))
+    return templates.response(request, "login.html")
 
 @app.post("/login")
 async def login(request: Request):
@@ -206,7 +487,7 @@ async def login(request: Request):
     password = form_data.get("password")
 
     if not username or not password:
-        return HTMLResponse(content=read_html("app/static/templates/login.html"))
+        return templates.response(request, "login.html")
 
     user = await get_user_by_email(username)
     if not user or user["password"] != password:
@@ -227,6 +508,7 @@ async def logout(request: Request):
 
     sessionId = request.cookies.get("sessionId")
     if sessionId:
+        session_cache.pop(sessionId)
         await delete_session(sessionId)
 
     response = RedirectResponse(url="/login", status_code=303)
@@ -235,8 +517,8 @@ async def logout(request: Request):
 
 
 # Device Management Routes
-@app.get("/api/devices", response_class=JSONResponse)
-async def get_user_devices(request: Request) -> JSONResponse:
+@app.get("/api/devices", response_class=FastJSONResponse)
+async def get_user_devices(request: Request) -> FastJSONResponse:
     """Get all devices for the authenticated user"""
 
     user = await verify_session(request)
@@ -245,12 +527,12 @@ async def get_user_devices(request: Request) -> JSONResponse:
     
     try:
         devices = await get_devices(user["id"])
-        return JSONResponse(devices)
+        return FastJSONResponse(devices)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get devices: {str(e)}")
     
-@app.get("/api/devices/{device_id}", response_class=JSONResponse)
-async def get_user_device(request: Request, device_id: str) -> JSONResponse:
+@app.get("/api/devices/{device_id}", response_class=FastJSONResponse)
+async def get_user_device(request: Request, device_id: str) -> FastJSONResponse:
     """Get a device for the authenticated user"""
 
     user = await verify_session(request)
@@ -259,12 +541,12 @@ async def get_user_device(request: Request, device_id: str) -> JSONResponse:
     
     try:
         await get_device(user["id"], device_id)
-        return JSONResponse({"success": True, "message": "A device was retrieved"})
+        return FastJSONResponse({"success": True, "message": "A device was retrieved"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to remove device: {str(e)}")
     
-@app.post("/api/devices", response_class=JSONResponse)
-async def add_new_device(request: Request, device_id: str = Body(...), mac_address: str = Body(...)) -> JSONResponse:
+@app.post("/api/devices", response_class=FastJSONResponse)
+async def add_new_device(request: Request, device_id: str = Body(...), mac_address: str = Body(...)) -> FastJSONResponse:
     """Add a new device for the authenticated user"""
 
     user = await verify_session(request)
@@ -273,12 +555,13 @@ async def add_new_device(request: Request, device_id: str = Body(...), mac_addre
     
     try:
         await add_device(user["id"], device_id, mac_address)
-        return JSONResponse({"success": True, "message": "Device added successfully"})
+        device_registry.forget(mac_address)
+        return FastJSONResponse({"success": True, "message": "Device added successfully"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add device: {str(e)}")
     
-@app.delete("/api/devices/{device_id}", response_class=JSONResponse)
-async def remove_user_device(request: Request, device_id: str, mac_address: str = Query(...)) -> JSONResponse:
+@app.delete("/api/devices/{device_id}", response_class=FastJSONResponse)
+async def remove_user_device(request: Request, device_id: str, mac_address: str = Query(...)) -> FastJSONResponse:
     """Remove a device for the authenticated user"""
 
     user = await verify_session(request)
@@ -287,16 +570,100 @@ async def remove_user_device(request: Request, device_id: str, mac_address: str
     
     try:
         await remove_device(user["id"], device_id, mac_address)
-        return JSONResponse({"success": True, "message": "Device removed successfully"})
+        device_registry.forget(mac_address)
+        return FastJSONResponse({"success": True, "message": "Device removed successfully"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to remove device: {str(e)}")
 
     
 
 # Sensor Data Routes
-@app.get("/api/devices/{device_id}/data", response_class=JSONResponse)
-async def get_sensor_data(request: Request, device_id: int, start_date: str = Query(None), end_date: str = Query(None)) -> JSONResponse:
-    """Get sensor data for a specific device"""
+def publish_sensor_readings(readings: list):
+    """Push stored (user_id, device_id, temperature, pressure, units, timestamp) rows to live subscribers"""
+
+    for user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp in readings:
+        sensor_broker.publish((user_id, device_id), {
+            "timestamp": timestamp,
+            "temperature": temperature,
+            "pressure": pressure,
+            "temperature_unit": temperature_unit,
+            "pressure_unit": pressure_unit
+        })
+
+async def encode_text_chunks(chunks, fmt: str):
+    """Yield encoded NDJSON or CSV for each SensorSeries chunk"""
+
+    if fmt == "csv":
+        yield csv_header()
+    encode = csv_chunk if fmt == "csv" else ndjson_chunk
+    async for series in chunks:
+        yield encode(series)
+
+async def single_chunk(series):
+    yield series
+
+async def sensor_rows_response(chunks, fmt: str, schema=SENSOR_SCHEMA, headers: Optional[dict] = None) -> Response:
+    """Encode SensorSeries chunks as ndjson, csv, arrow or parquet; all but parquet are streamed"""
+
+    if fmt == "parquet":
+        return Response(content=await parquet_bytes(chunks, schema), media_type=PARQUET_MEDIA_TYPE, headers=headers)
+    body = arrow_stream(chunks, schema) if fmt == "arrow" else encode_text_chunks(chunks, fmt)
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers)
+
+def negotiate_sensor_format(request: Request, format: Optional[str]) -> str:
+    """Pick json, columnar, arrow or parquet from ?format= or, failing that, the Accept header"""
+
+    if format:
+        if format not in ("json", "columnar", "arrow", "parquet"):
+            raise HTTPException(status_code=400, detail="format must be one of json, columnar, arrow, parquet")
+        return format
+    accept = request.headers.get("accept", "")
+    if ARROW_MEDIA_TYPE in accept:
+        return "arrow"
+    if PARQUET_MEDIA_TYPE in accept:
+        return "parquet"
+    return "json"
+
+def parse_resolution(resolution: str) -> int:
+    """Parse a bucket width like '300', '30s', '5m', '1h' or '1d' into seconds"""
+
+    value = resolution.strip().lower()
+    multiplier = 1
+    if value and value[-1] in RESOLUTION_UNITS:
+        multiplier = RESOLUTION_UNITS[value[-1]]
+        value = value[:-1]
+    try:
+        seconds = int(value) * multiplier
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid resolution: {resolution}")
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail=f"Invalid resolution: {resolution}")
+    return seconds
+
+def choose_bucket_seconds(start: datetime.datetime, end: datetime.datetime, requested: int, max_points: int) -> int:
+    """Pick the narrowest standard bucket at least as wide as requested that keeps the range under max_points"""
+
+    span = max((end - start).total_seconds(), 1)
+    minimum = max(requested, -(-int(span) // max_points))
+    for size in BUCKET_SIZES:
+        if size >= minimum:
+            return size
+    day = BUCKET_SIZES[-1]
+    return -(-minimum // day) * day
+
+@app.get("/api/devices/{device_id}/data", response_class=FastJSONResponse)
+async def get_sensor_data(request: Request, device_id: int, start_date: str = Query(None), end_date: str = Query(None), resolution: str = Query(None), agg: str = Query(None), max_points: int = Query(DEFAULT_MAX_POINTS, ge=1, le=MAX_POINTS_LIMIT), since: str = Query(None), stream: bool = Query(False), format: str = Query(None)) -> Response:
+    """
+    Get sensor data for a specific device.
+    With resolution ('auto', seconds, or e.g. '5m') or agg (avg/min/max/last), readings are
+    aggregated into time buckets server-side and at most max_points buckets are returned.
+    With since (the X-Latest-Timestamp of a previous response), only raw rows newer than it,
+    or buckets from the one containing it onwards, are returned; 304 if nothing is newer.
+    With stream=true, raw rows are streamed as NDJSON instead of a single JSON array.
+    format=arrow|parquet, or an Accept of application/vnd.apache.arrow.stream or
+    application/vnd.apache.parquet, returns columnar data built directly from the cursor.
+    format=columnar returns JSON with one array per column and units sent once.
+    """
 
     user = await verify_session(request)
     if not user:
@@ -306,53 +673,267 @@ async def get_sensor_data(request: Request, device_id: int, start_date: str = Qu
         start_date = (datetime.datetime.now() - datetime.timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
     if not end_date:
         end_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        start = parse_timestamp(start_date)
+        end = parse_timestamp(end_date)
+        since_time = parse_timestamp(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date, end_date and since must be 'YYYY-MM-DD HH:MM:SS'")
+
+    fmt = negotiate_sensor_format(request, format)
+    bucket_seconds = None
+    if resolution or agg:
+        agg = agg or "avg"
+        if agg not in SENSOR_AGGREGATES:
+            raise HTTPException(status_code=400, detail=f"agg must be one of {', '.join(SENSOR_AGGREGATES)}")
+        requested = parse_resolution(resolution) if resolution and resolution != "auto" else 1
+        bucket_seconds = choose_bucket_seconds(start, end, requested, max_points)
     
     try:
-        data = await get_sensorData(user["id"], device_id, start_date, end_date)
-        
-        formatted_data = []
-        for record in data:
-            formatted_data.append({
-                "timestamp": record[0].strftime('%Y-%m-%d %H:%M:%S') if hasattr(record[0], 'strftime') else record[0],
-                "temperature": record[1],
-                "pressure": record[2],
-                "temperature_unit": record[3],
-                "pressure_unit": record[4]
-            })
+        latest = await get_latest_sensor_timestamp(user["id"], device_id)
+        latest_str = latest.strftime(TIMESTAMP_FORMAT) if latest else ""
+        etag = 'W/"' + hashlib.sha1(
+            f"{device_id}|{latest_str}|{start}|{min(end, latest) if latest else end}|{since_time}|{bucket_seconds}|{agg}|{fmt}|{stream}".encode()
+        ).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept", "X-Latest-Timestamp": latest_str}
+        if bucket_seconds:
+            headers["X-Bucket-Seconds"] = str(bucket_seconds)
+
+        unchanged = since_time is not None and (latest is None or latest <= since_time)
+        if unchanged or request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        if since_time is not None:
+            if bucket_seconds:
+                # Resend the bucket containing since, which may have grown
+                offset = int((since_time - datetime.datetime(1970, 1, 1)).total_seconds()) % bucket_seconds
+                start = max(start, since_time - datetime.timedelta(seconds=offset))
+            else:
+                # Timestamps have one-second precision
+                start = max(start, since_time + datetime.timedelta(seconds=1))
+        time_start = start.strftime('%Y-%m-%d %H:%M:%S')
+        time_end = end.strftime('%Y-%m-%d %H:%M:%S')
+
+        if fmt in ("arrow", "parquet"):
+            if bucket_seconds:
+                series = await get_sensorData_buckets(user["id"], device_id, time_start, time_end, bucket_seconds, agg)
+                return await sensor_rows_response(single_chunk(series), fmt, BUCKET_SCHEMA, headers)
+            chunks = iter_sensorData(user["id"], device_id, time_start, time_end, EXPORT_CHUNK_ROWS)
+            return await sensor_rows_response(chunks, fmt, SENSOR_SCHEMA, headers)
+
+        if stream and not bucket_seconds:
+            chunks = iter_sensorData(user["id"], device_id, time_start, time_end, EXPORT_CHUNK_ROWS)
+            return await sensor_rows_response(chunks, "ndjson", headers=headers)
+
+        if bucket_seconds:
+            data = await get_sensorData_buckets(user["id"], device_id, time_start, time_end, bucket_seconds, agg)
+        else:
+            data = await get_sensorData(user["id"], device_id, time_start, time_end)
+
+        if fmt == "columnar":
+            return FastJSONResponse(columnar_json(data), headers=headers)
         
-        return JSONResponse(formatted_data)
+        return Response(content=records_json(data), media_type="application/json", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get sensor data: {str(e)}")
 
-@app.post("/api/devices/{device_id}/data", response_class=JSONResponse)
-async def post_sensor_data(request: Request, device_id: int, temperature: float = Body(...), pressure: float = Body(...), temperature_unit: str = Body("°C"), pressure_unit: str = Body("hPa"), timestamp: str = Body(...)) -> JSONResponse:
+@app.get("/api/devices/{device_id}/export")
+async def export_sensor_data(request: Request, device_id: int, start_date: str = Query(None), end_date: str = Query(None), format: str = Query("ndjson")) -> Response:
+    """Stream the full sensor history of a device in a range as NDJSON, CSV, Arrow or Parquet"""
+
+    user = await verify_session(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_MEDIA_TYPES)}")
+
+    if not start_date:
+        start_date = "1970-01-01 00:00:00"
+    if not end_date:
+        end_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Checked up front: once streaming starts the status and headers are already sent
+    try:
+        start = parse_timestamp(start_date)
+        end = parse_timestamp(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be 'YYYY-MM-DD HH:MM:SS'")
+
+    filename = f"device-{device_id}-sensordata.{format}"
+    chunks = iter_sensorData(user["id"], device_id, start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'), EXPORT_CHUNK_ROWS)
+    return await sensor_rows_response(chunks, format, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/api/devices/{device_id}/data", response_class=FastJSONResponse)
+async def post_sensor_data(request: Request, device_id: int, temperature: float = Body(...), pressure: float = Body(...), temperature_unit: str = Body("°C"), pressure_unit: str = Body("hPa"), timestamp: str = Body(...)) -> FastJSONResponse:
     """Store sensor data for a device"""
 
     user = await verify_session(request)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
+
+    try:
+        timestamp = parse_timestamp(timestamp)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
         await add_sensorData(user["id"], device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)
-        return JSONResponse({"success": True, "message": "Data added successfully"})
+        publish_sensor_readings([(user["id"], device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)])
+        return FastJSONResponse({"success": True, "message": "Data added successfully"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add sensor data: {str(e)}")
 
-@app.post("/api/sensor-data/{mac_address}", response_class=JSONResponse)
+@app.get("/api/devices/{device_id}/stream")
+async def stream_sensor_data(request: Request, device_id: int) -> StreamingResponse:
+    """Push readings for a device as Server-Sent Events as soon as they are stored"""
+
+    user = await verify_session(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    key = (user["id"], device_id)
+    queue = sensor_broker.subscribe(key)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    reading = await asyncio.wait_for(queue.get(), SENSOR_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield "data: " + dumps(reading).decode() + "\n\n"
+        finally:
+            sensor_broker.unsubscribe(key, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def parse_timestamp(value) -> datetime.datetime:
+    """
+    Parse a device-supplied reading time, defaulting to now; raises ValueError if invalid.
+    Accepts the ISO 8601 spellings MySQL does but Python 3.9 does not (a trailing Z, an
+    offset without a colon, any number of fractional digits). Zoned times are converted
+    to UTC, and every result is truncated to the column's one-second precision.
+    """
+
+    if value is None:
+        return datetime.datetime.now().replace(microsecond=0)
+    text = str(value).strip()
+    text = TIMESTAMP_FRACTION.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), text)
+    text = TIMESTAMP_OFFSET.sub(lambda match: "+00:00" if match.group(0) in ("Z", "z") else f"{match.group(1)}:{match.group(2)}", text)
+    try:
+        timestamp = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"invalid timestamp: {value}")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(microsecond=0)
+
+@app.post("/api/sensor-data/{mac_address}", response_class=FastJSONResponse)
 async def receive_sensor_data(mac_address: str, temperature: float = Body(...), pressure: float = Body(...), temperature_unit: str = Body("°C"), pressure_unit: str = Body("hPa"), timestamp: str = Body(None)):
     """Receive sensor data from MQTT client"""
     
     try:
-        device = await get_device_by_mac_address(mac_address)
+        device = await device_registry.lookup(mac_address)
         if not device:
-            return JSONResponse(status_code=404, content={"error": f"No device found with MAC address: {mac_address}"})
+            return FastJSONResponse(status_code=404, content={"error": f"No device found with MAC address: {mac_address}"})
         
-        user_id = device["user_id"]
-        device_id = device["id"]
+        user_id, device_id = device
+        try:
+            timestamp = parse_timestamp(timestamp)
+        except ValueError as e:
+            return FastJSONResponse(status_code=400, content={"error": str(e)})
+
+        if ingest_buffer:
+            queued = await ingest_buffer.put((user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp))
+            if not queued:
+                return FastJSONResponse(status_code=503, content={"error": "Ingest queue is full, retry later"}, headers={"Retry-After": "1"})
+            return FastJSONResponse(status_code=202, content={"message": "Data queued successfully"})
+
         await add_sensorData(user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)
-        return JSONResponse(status_code=200, content={"message": "Data received successfully"})
+        publish_sensor_readings([(user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)])
+        return FastJSONResponse(status_code=200, content={"message": "Data received successfully"})
+    except Overloaded:
+        raise
+    except Exception as e:
+        return FastJSONResponse(status_code=500, content={"error": f"Failed to process sensor data: {str(e)}"})
+
+def parse_sensor_reading(item) -> tuple:
+    """Validate one batch reading; returns (mac_address, values) or raises ValueError"""
+
+    if not isinstance(item, dict):
+        raise ValueError("reading must be an object")
+
+    mac_address = item.get("mac_address")
+    if not mac_address or not isinstance(mac_address, str):
+        raise ValueError("mac_address is required")
+
+    try:
+        temperature = float(item["temperature"])
+        pressure = float(item["pressure"])
+    except KeyError as e:
+        raise ValueError(f"{e.args[0]} is required")
+    except (TypeError, ValueError):
+        raise ValueError("temperature and pressure must be numbers")
+    if not math.isfinite(temperature) or not math.isfinite(pressure):
+        raise ValueError("temperature and pressure must be finite")
+
+    temperature_unit = item.get("temperature_unit", "°C")
+    pressure_unit = item.get("pressure_unit", "hPa")
+    if not isinstance(temperature_unit, str) or not isinstance(pressure_unit, str):
+        raise ValueError("units must be strings")
+    if len(temperature_unit) > MAX_UNIT_LENGTH or len(pressure_unit) > MAX_UNIT_LENGTH:
+        raise ValueError(f"units must be at most {MAX_UNIT_LENGTH} characters")
+
+    timestamp = parse_timestamp(item.get("timestamp"))
+    return mac_address, (temperature, pressure, temperature_unit, pressure_unit, timestamp)
+
+@app.post("/api/sensor-data", response_class=FastJSONResponse)
+async def receive_sensor_data_batch(readings: List[Any] = Body(..., embed=True)):
+    """Receive a batch of buffered sensor readings, possibly for many devices"""
+
+    if len(readings) > MAX_BATCH_READINGS:
+        return FastJSONResponse(status_code=413, content={"error": f"At most {MAX_BATCH_READINGS} readings per request"})
+
+    results = []
+    parsed = []
+    for index, item in enumerate(readings):
+        try:
+            mac_address, values = parse_sensor_reading(item)
+            parsed.append((index, mac_address, values))
+            results.append({"index": index, "status": "accepted"})
+        except ValueError as e:
+            results.append({"index": index, "status": "rejected", "error": str(e)})
+
+    try:
+        devices = await device_registry.lookup_many(mac for _, mac, _ in parsed)
+
+        rows = []
+        for index, mac_address, values in parsed:
+            device = devices.get(mac_address)
+            if not device:
+                results[index] = {"index": index, "status": "rejected", "error": f"No device found with MAC address: {mac_address}"}
+                continue
+            rows.append(tuple(device) + values)
+
+        await add_sensorData_batch(rows)
+        publish_sensor_readings(rows)
+    except Overloaded:
+        raise
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Failed to process sensor data: {str(e)}"})
+        return FastJSONResponse(status_code=500, content={"error": f"Failed to process sensor data: {str(e)}"})
+
+    return FastJSONResponse(status_code=200, content={
+        "accepted": len(rows),
+        "rejected": len(results) - len(rows),
+        "results": results
+    })
 
 
 # Wardrobe Management Routes
@@ -363,10 +944,10 @@ async def wardrobe_page(request: Request):
     user = await verify_session(request)
     if not user:
         return RedirectResponse(url="/login", status_code=303)
-    return HTMLResponse(content=read_html("app/static/templates/wardrobe.html"))
+    return templates.response(request, "wardrobe.html")
 
-@app.get("/api/wardrobe", response_class=JSONResponse)
-async def get_user_wardrobe(request: Request) -> JSONResponse:
+@app.get("/api/wardrobe", response_class=FastJSONResponse)
+async def get_user_wardrobe(request: Request) -> FastJSONResponse:
     """Get all clothing items for the authenticated user"""
     
     user = await verify_session(request)
@@ -375,12 +956,12 @@ async def get_user_wardrobe(request: Request) -> JSONResponse:
     
     try:
         wardrobe = await get_wardrobe(user["id"])
-        return JSONResponse(wardrobe)
+        return FastJSONResponse(wardrobe)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get wardrobe: {str(e)}")
 
-@app.get("/api/wardrobe/{clothing_id}", response_class=JSONResponse)
-async def get_user_wardrobe(request: Request, clothing_id: int) -> JSONResponse:
+@app.get("/api/wardrobe/{clothing_id}", response_class=FastJSONResponse)
+async def get_user_wardrobe(request: Request, clothing_id: int) -> FastJSONResponse:
     """Get all clothing items for the authenticated user"""
     
     user = await verify_session(request)
@@ -389,12 +970,12 @@ async def get_user_wardrobe(request: Request, clothing_id: int) -> JSONResponse:
     
     try:
         wardrobe = await get_clothing(user["id"], clothing_id)
-        return JSONResponse(wardrobe)
+        return FastJSONResponse(wardrobe)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get clothing: {str(e)}")
     
-@app.post("/api/wardrobe", response_class=JSONResponse)
-async def add_clothing_item(request: Request, name: str = Body(...), color: str = Body(...)) -> JSONResponse:
+@app.post("/api/wardrobe", response_class=FastJSONResponse)
+async def add_clothing_item(request: Request, name: str = Body(...), color: str = Body(...)) -> FastJSONResponse:
     """Add a new clothing item to the wardrobe"""
     
     user = await verify_session(request)
@@ -403,12 +984,12 @@ async def add_clothing_item(request: Request, name: str = Body(...), color: str
     
     try:
         await add_clothing(user["id"], name, color)
-        return JSONResponse({"success": True, "message": "Clothing item added successfully"})
+        return FastJSONResponse({"success": True, "message": "Clothing item added successfully"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add clothing item: {str(e)}")
     
-@app.put("/api/wardrobe/{clothing_id}", response_class=JSONResponse)
-async def update_clothing_item(request: Request, clothing_id: int, new_name: str = Body(...), new_color: str = Body(...)) -> JSONResponse:
+@app.put("/api/wardrobe/{clothing_id}", response_class=FastJSONResponse)
+async def update_clothing_item(request: Request, clothing_id: int, new_name: str = Body(...), new_color: str = Body(...)) -> FastJSONResponse:
     """Update a clothing item in the wardrobe"""
     
     user = await verify_session(request)
@@ -417,12 +998,12 @@ async def update_clothing_item(request: Request, clothing_id: int, new_name: str
     
     try:
         await update_clothing(user["id"], clothing_id, new_name, new_color)
-        return JSONResponse({"success": True, "message": "Clothing item updated successfully"})
+        return FastJSONResponse({"success": True, "message": "Clothing item updated successfully"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update clothing item: {str(e)}")
     
-@app.delete("/api/wardrobe/{clothing_id}", response_class=JSONResponse)
-async def remove_clothing_item(request: Request, clothing_id: int) -> JSONResponse:
+@app.delete("/api/wardrobe/{clothing_id}", response_class=FastJSONResponse)
+async def remove_clothing_item(request: Request, clothing_id: int) -> FastJSONResponse:
     """Remove a clothing item from the wardrobe"""
     
     user = await verify_session(request)
@@ -431,33 +1012,120 @@ async def remove_clothing_item(request: Request, clothing_id: int) -> JSONRespon
     
     try:
         await remove_clothing(user["id"], clothing_id)
-        return JSONResponse({"success": True, "message": "Clothing item removed successfully"})
+        return FastJSONResponse({"success": True, "message": "Clothing item removed successfully"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to remove clothing item: {str(e)}")
 
 
+# Metrics route
+@app.get("/api/metrics", response_class=FastJSONResponse)
+async def get_metrics(request: Request) -> FastJSONResponse:
+    """Report in-process cache counters for capacity planning; internal, needs METRICS_TOKEN"""
+
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    authorization = request.headers.get("authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    return FastJSONResponse({
+        "db_pool": get_db_pool().stats(),
+        "session_cache": session_cache.stats(),
+        "ingest_buffer": ingest_buffer.stats() if ingest_buffer else None,
+        "sensor_streams": sensor_broker.stats(),
+        "static_assets": assets.stats(),
+        "ai": ai_client.stats(),
+        "weather": weather_service.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "device_registry": device_registry.stats(),
+        "file_executor": file_executor.stats(),
+        "sensor_retention": sensor_retention.stats(),
+        "sensor_archive": sensor_archive.stats()
+    })
+
+
+# Outfit recommendation route
+def build_outfit_prompt(wardrobe: list, weather: dict) -> str:
+    """The prompt the dashboard used to assemble in the browser"""
+
+    conditions = (
+        f"It is currently {weather['temperature']} {weather['temperature_unit']} and {weather['conditions']} "
+        f"outside and forecasted to be {weather['forecast']}."
+    )
+    if not wardrobe:
+        return (
+            f"{conditions} The user does not have any clothes added to their wardrobe, "
+            "tell them so and what they should buy to fit the current conditions."
+        )
+
+    clothing_list = ", ".join(
+        f"{item['color']} {item['name']}" if item["color"] else item["name"] for item in wardrobe
+    )
+    return (
+        f"{conditions} I need to decide what to wear from the following list: {clothing_list}. "
+        "What should I wear? Do not comment on non chosen items."
+    )
+
+def wardrobe_digest(wardrobe: list) -> str:
+    """Fingerprint of a wardrobe's items; changes whenever one is added, edited or removed"""
+
+    items = sorted((item["id"], item["name"], item["color"]) for item in wardrobe)
+    return hashlib.sha1(dumps(items)).hexdigest()
+
+@app.get("/api/recommendation", response_class=FastJSONResponse)
+async def get_recommendation(request: Request) -> FastJSONResponse:
+    """
+    Recommend an outfit from the user's wardrobe for their current weather.
+    Answers are memoized per wardrobe contents and weather bucket (forecast grid
+    cell, period, conditions and temperature to the nearest 5 degrees).
+    """
+
+    user = await verify_session(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    weather = await get_user_weather(user)
+    try:
+        wardrobe = await get_wardrobe(user["id"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get wardrobe: {str(e)}")
+
+    weather_bucket = (weather["grid"], weather["period"], weather["conditions"], weather["forecast"], round(weather["temperature"] / 5))
+    key = (user["id"], wardrobe_digest(wardrobe), weather_bucket)
+
+    cached = recommendation_cache.get(key)
+    if cached is not None:
+        return FastJSONResponse({**cached, "cached": True})
+
+    try:
+        result, _ = await ai_client.complete({"prompt": build_outfit_prompt(wardrobe, weather)})
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to get recommendation: {str(e)}")
+
+    try:
+        text = orjson.loads(result.content)["result"]["response"]
+    except (ValueError, KeyError, TypeError):
+        text = None
+    if result.status_code != 200 or not isinstance(text, str):
+        raise HTTPException(status_code=502, detail=f"AI service returned an invalid response ({result.status_code})")
+
+    recommendation = {"recommendation": text, "weather": weather}
+    recommendation_cache.set(key, recommendation)
+    return FastJSONResponse({**recommendation, "cached": False})
+
+
 # AI api route
 @app.post("/api/ai")
 async def proxy_ai_complete(request: Request):
+    """Forward a completion request upstream; repeats are served from cache and concurrent duplicates share one call"""
+
     try:
         data = await request.json()
-        headers = {
-            'Content-Type': 'application/json',
-            'email': os.getenv('UCSD_EMAIL'),
-            'pid': os.getenv('UCSD_PID')
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://ece140-wi25-api.frosty-sky-f43d.workers.dev/api/v1/ai/complete",
-                json=data,
-                headers=headers,
-                timeout=30.0
-            )
-            return Response(content=response.content, status_code=response.status_code)
+        result, source = await ai_client.complete(data)
+        return Response(content=result.content, status_code=result.status_code, media_type=result.media_type, headers={"X-Cache": source.upper()})
         
     except Exception as e:
-        return JSONResponse(status_code=500,  content={"error": f"An unexpected error occurred: {str(e)}"})
+        return FastJSONResponse(status_code=500,  content={"error": f"An unexpected error occurred: {str(e)}"})
 
 
 
@@ -0,0 +1,241 @@
+import logging
+
+from typing import Callable, List, NamedTuple, Union
+
+from app.partitions import partition_sensordata
+
+logger = logging.getLogger(__name__)
+
+# Named lock held while migrating, so replicas starting together apply each migration once
+MIGRATION_LOCK = "ece140_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 120  # seconds
+
+
+class Migration(NamedTuple):
+    """A schema change; steps are SQL strings or callables taking a cursor"""
+
+    version: int
+    description: str
+    steps: List[Union[str, Callable]]
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """,
+        (table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def add_index(table: str, index: str, definition: str) -> Callable:
+    """Step that adds an index unless it already exists (MySQL has no ADD INDEX IF NOT EXISTS)"""
+
+    def step(cursor):
+        if _index_exists(cursor, table, index):
+            logger.info(f"Index {index} on {table} already exists")
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+
+    return step
+
+
+def rollup_table(table: str) -> str:
+    """DDL for a per-(user_id, device_id) rollup of sensordata"""
+
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id INT NOT NULL,
+            device_id INT NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            sample_count INT NOT NULL,
+            temperature_sum DOUBLE NOT NULL,
+            temperature_min FLOAT NOT NULL,
+            temperature_max FLOAT NOT NULL,
+            temperature_last FLOAT NOT NULL,
+            pressure_sum DOUBLE NOT NULL,
+            pressure_min FLOAT NOT NULL,
+            pressure_max FLOAT NOT NULL,
+            pressure_last FLOAT NOT NULL,
+            temperature_unit VARCHAR(50) NOT NULL,
+            pressure_unit VARCHAR(50) NOT NULL,
+            last_timestamp DATETIME NOT NULL,
+            PRIMARY KEY (user_id, device_id, bucket_start)
+        )
+    """
+
+
+def backfill_rollup(table: str, bucket_seconds: int) -> Callable:
+    """Step that rebuilds a rollup table from the raw readings already in sensordata"""
+
+    def step(cursor):
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("SET SESSION group_concat_max_len = 1048576")
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (user_id, device_id, bucket_start, sample_count,
+                                 temperature_sum, temperature_min, temperature_max, temperature_last,
+                                 pressure_sum, pressure_min, pressure_max, pressure_last,
+                                 temperature_unit, pressure_unit, last_timestamp)
+            SELECT user_id, device_id,
+                   TIMESTAMP('1970-01-01 00:00:00') + INTERVAL (TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', timestamp) DIV {bucket_seconds} * {bucket_seconds}) SECOND AS bucket,
+                   COUNT(*),
+                   SUM(temperature), MIN(temperature), MAX(temperature),
+                   SUBSTRING_INDEX(GROUP_CONCAT(temperature ORDER BY timestamp DESC), ',', 1),
+                   SUM(pressure), MIN(pressure), MAX(pressure),
+                   SUBSTRING_INDEX(GROUP_CONCAT(pressure ORDER BY timestamp DESC), ',', 1),
+                   SUBSTRING_INDEX(GROUP_CONCAT(temperature_unit ORDER BY timestamp DESC SEPARATOR '\\n'), '\\n', 1),
+                   SUBSTRING_INDEX(GROUP_CONCAT(pressure_unit ORDER BY timestamp DESC SEPARATOR '\\n'), '\\n', 1),
+                   MAX(timestamp)
+            FROM sensordata
+            WHERE temperature IS NOT NULL AND pressure IS NOT NULL
+            GROUP BY user_id, device_id, bucket
+            """
+        )
+
+    return step
+
+
+# Every migration must be safe to re-run against a database that already has
+# some or all of its changes, e.g. one created by the old drop-and-create setup.
+MIGRATIONS = [
+    Migration(1, "Initial users, sessions, devices, wardrobes and sensordata tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) NOT NULL UNIQUE,
+            location VARCHAR(255),
+            password VARCHAR(255) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            token VARCHAR(255) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS devices (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            device_id VARCHAR(100) NOT NULL,
+            mac_address VARCHAR(100) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wardrobes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            color VARCHAR(50),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sensordata (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            device_id VARCHAR(100) NOT NULL,
+            temperature FLOAT,
+            pressure FLOAT,
+            temperature_unit VARCHAR(50) NOT NULL,
+            pressure_unit VARCHAR(50) NOT NULL,
+            timestamp DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    # sensordata (user_id, device_id, timestamp) -> get_sensorData range scans, ordered by time
+    # sessions.token (unique)                    -> get_session_user
+    # devices.mac_address (unique)               -> device registry lookups and batch ingest
+    # sensordata.device_id holds devices.id; as a VARCHAR compared with an integer it defeats the index
+    Migration(2, "Indexes for session, MAC and sensor range lookups", [
+        "ALTER TABLE sensordata MODIFY id BIGINT AUTO_INCREMENT, MODIFY device_id INT NOT NULL",
+        add_index("sensordata", "idx_sensordata_user_device_ts",
+                  "KEY idx_sensordata_user_device_ts (user_id, device_id, timestamp)"),
+        add_index("sessions", "uq_sessions_token", "UNIQUE KEY uq_sessions_token (token)"),
+        add_index("devices", "uq_devices_mac_address", "UNIQUE KEY uq_devices_mac_address (mac_address)"),
+    ]),
+    # Minute and hour rollups maintained on every sensor insert; coarse range queries read these
+    Migration(3, "Minute and hour rollups of sensordata", [
+        rollup_table("sensordata_1m"),
+        rollup_table("sensordata_1h"),
+        backfill_rollup("sensordata_1m", 60),
+        backfill_rollup("sensordata_1h", 3600),
+    ]),
+    # Month partitions on sensordata.timestamp so expired readings go with a DROP PARTITION;
+    # partitioned tables cannot have foreign keys, so sensordata.user_id loses its cascade.
+    # retention_days 0 keeps a user's readings forever; users without a row get SENSOR_RETENTION_DAYS
+    Migration(4, "Partition sensordata by month and add per-user retention policies", [
+        partition_sensordata(),
+        """
+        CREATE TABLE IF NOT EXISTS retention_policies (
+            user_id INT PRIMARY KEY,
+            retention_days INT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+]
+
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def run_migrations(cursor) -> List[int]:
+    """
+    Apply pending migrations in order and return the versions applied.
+    Runs on a single connection so the named lock covers every step.
+    """
+
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError(f"Timed out after {MIGRATION_LOCK_TIMEOUT}s waiting for the migration lock")
+
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        cursor.execute("SELECT version FROM schema_version")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        newly_applied = []
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+
+            logger.info(f"Applying migration {migration.version}: {migration.description}")
+            for step in migration.steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description)
+            )
+            newly_applied.append(migration.version)
+
+        return newly_applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchone()
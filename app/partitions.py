@@ -0,0 +1,207 @@
+import logging
+import datetime
+
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "sensordata"
+
+# Catch-all for readings dated past the last monthly partition (bad device clocks);
+# new months are split off it, which is instant while it is empty
+OVERFLOW_PARTITION = "pmax"
+
+# Named lock held by partition maintenance, so only one replica runs DDL at a time
+MAINTENANCE_LOCK = "ece140_sensordata_maintenance"
+
+# Readings older than this many months when the table is first partitioned all
+# land in the first partition instead of one partition per month
+MAX_INITIAL_MONTHS = 120
+
+
+class Partition(NamedTuple):
+    """A sensordata partition holding readings with timestamp < less_than (None for the overflow)"""
+
+    name: str
+    less_than: Optional[datetime.datetime]
+
+
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime.datetime, months: int) -> datetime.datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.datetime) -> str:
+    """p202501 holds readings from January 2025"""
+    return f"p{month:%Y%m}"
+
+
+def _month_partition(month: datetime.datetime) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d %H:%M:%S}')"
+
+
+def _month_partitions(first: datetime.datetime, last: datetime.datetime) -> List[str]:
+    """Partition clauses for every month from first to last inclusive, then the overflow"""
+
+    clauses = []
+    month = first
+    while month <= last:
+        clauses.append(_month_partition(month))
+        month = add_months(month, 1)
+    clauses.append(f"PARTITION {OVERFLOW_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return clauses
+
+
+def list_partitions(cursor, table: str = PARTITIONED_TABLE) -> List[Partition]:
+    """Partitions of a table in order; empty if it is not partitioned"""
+
+    cursor.execute(
+        """
+        SELECT partition_name, partition_description
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+        """,
+        (table,)
+    )
+    partitions = []
+    for name, description in cursor.fetchall():
+        if description == "MAXVALUE":
+            partitions.append(Partition(name, None))
+        else:
+            partitions.append(Partition(name, datetime.datetime.fromisoformat(description.strip("'"))))
+    return partitions
+
+
+def partition_sensordata(months_ahead: int = 3) -> Callable:
+    """
+    Migration step that range-partitions sensordata by month on timestamp.
+
+    MySQL requires the partitioning column in every unique key and allows no
+    foreign keys on partitioned tables, so the user_id foreign key is dropped
+    and the primary key becomes (id, timestamp). Rebuilds the table once.
+    """
+
+    def step(cursor):
+        if list_partitions(cursor):
+            logger.info(f"{PARTITIONED_TABLE} is already partitioned")
+            return
+
+        cursor.execute(
+            """
+            SELECT constraint_name FROM information_schema.referential_constraints
+            WHERE constraint_schema = DATABASE() AND table_name = %s
+            """,
+            (PARTITIONED_TABLE,)
+        )
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {PARTITIONED_TABLE} DROP FOREIGN KEY `{constraint}`")
+
+        cursor.execute(
+            """
+            SELECT GROUP_CONCAT(column_name ORDER BY ordinal_position)
+            FROM information_schema.key_column_usage
+            WHERE table_schema = DATABASE() AND table_name = %s AND constraint_name = 'PRIMARY'
+            """,
+            (PARTITIONED_TABLE,)
+        )
+        if cursor.fetchone()[0] != "id,timestamp":
+            cursor.execute(f"ALTER TABLE {PARTITIONED_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+
+        cursor.execute(f"SELECT MIN(timestamp) FROM {PARTITIONED_TABLE}")
+        oldest = cursor.fetchone()[0]
+        this_month = month_start(datetime.datetime.now())
+        first = max(month_start(oldest), add_months(this_month, -MAX_INITIAL_MONTHS)) if oldest else this_month
+        clauses = _month_partitions(first, add_months(this_month, months_ahead))
+        cursor.execute(
+            f"ALTER TABLE {PARTITIONED_TABLE} PARTITION BY RANGE COLUMNS(timestamp) ({', '.join(clauses)})"
+        )
+        logger.info(f"Partitioned {PARTITIONED_TABLE} into {len(clauses)} partitions")
+
+    return step
+
+
+def add_future_partitions(cursor, now: datetime.datetime, months_ahead: int) -> List[str]:
+    """Split months up to months_ahead past now off the overflow partition; returns the new names"""
+
+    partitions = list_partitions(cursor)
+    bounded = [partition for partition in partitions if partition.less_than is not None]
+    if not bounded:
+        return []
+
+    first = bounded[-1].less_than
+    last = add_months(month_start(now), months_ahead)
+    if first > last:
+        return []
+
+    if partitions[-1].less_than is None:
+        clauses = _month_partitions(first, last)
+        cursor.execute(
+            f"ALTER TABLE {PARTITIONED_TABLE} REORGANIZE PARTITION {OVERFLOW_PARTITION} INTO ({', '.join(clauses)})"
+        )
+    else:
+        clauses = _month_partitions(first, last)[:-1]
+        cursor.execute(f"ALTER TABLE {PARTITIONED_TABLE} ADD PARTITION ({', '.join(clauses)})")
+
+    added = []
+    month = first
+    while month <= last:
+        added.append(partition_name(month))
+        month = add_months(month, 1)
+    logger.info(f"Added {PARTITIONED_TABLE} partitions {added}")
+    return added
+
+
+def expired_partitions(cursor, cutoff: datetime.datetime) -> List[Partition]:
+    """Monthly partitions whose every reading is older than cutoff"""
+
+    return [
+        partition for partition in list_partitions(cursor)
+        if partition.less_than is not None and partition.less_than <= cutoff
+    ]
+
+
+def drop_partitions(cursor, partitions: Iterable[Partition]) -> List[str]:
+    """Drop partitions, which removes their readings without a row-by-row delete"""
+
+    names = [partition.name for partition in partitions]
+    if names:
+        cursor.execute(f"ALTER TABLE {PARTITIONED_TABLE} DROP PARTITION {', '.join(names)}")
+        logger.info(f"Dropped {PARTITIONED_TABLE} partitions {names}")
+    return names
+
+
+def delete_rows_before(
+    cursor,
+    table: str,
+    time_column: str,
+    cutoff: datetime.datetime,
+    user_ids: Optional[List[int]] = None,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Delete rows older than cutoff in batches of batch_size, optionally only
+    for some users. For retention shorter than the
+    partition horizon, where dropping a whole month would take other users'
+    readings with it.
+    """
+
+    where = [f"{time_column} < %s"]
+    params: list = [cutoff]
+    if user_ids is not None:
+        if not user_ids:
+            return 0
+        where.append(f"user_id IN ({', '.join(['%s'] * len(user_ids))})")
+        params.extend(user_ids)
+
+    query = f"DELETE FROM {table} WHERE {' AND '.join(where)} LIMIT %s"
+    deleted = 0
+    while True:
+        cursor.execute(query, tuple(params) + (batch_size,))
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
@@ -0,0 +1,55 @@
+import asyncio
+
+from typing import Dict, Hashable, Set
+
+
+class SensorBroker:
+    """
+    In-process fan-out of stored sensor readings to live subscribers.
+    Publishing never blocks: a subscriber that falls behind loses its oldest
+    readings rather than slowing down ingest.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[Hashable, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, key: Hashable) -> asyncio.Queue:
+        """Register a new subscriber queue for a topic"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(key, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, key: Hashable, queue: asyncio.Queue):
+        """Remove a subscriber queue, dropping the topic once it has none left"""
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[key]
+
+    def publish(self, key: Hashable, message) -> int:
+        """Deliver a message to every subscriber of a topic; returns the number reached"""
+        subscribers = self._subscribers.get(key)
+        if not subscribers:
+            return 0
+
+        for queue in subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+        self.published += 1
+        return len(subscribers)
+
+    def stats(self) -> dict:
+        """Return topic/subscriber counts and delivery counters"""
+        return {
+            "topics": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,106 @@
+import datetime
+
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Record:
+    """
+    Base for lightweight row classes: one __slots__ attribute per selected
+    column, filled positionally from a cursor tuple. record["name"] works too,
+    so code written against dictionary rows does not have to change.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, name: str) -> Any:
+        return getattr(self, name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def _asdict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class SessionUser(Record):
+    """The user behind a session token, as cached by verify_session; never carries the password"""
+
+    __slots__ = ("id", "name", "email", "location", "created_at", "session_expires_at")
+
+    id: int
+    name: str
+    email: str
+    location: Optional[str]
+    created_at: datetime.datetime
+    session_expires_at: datetime.datetime
+
+
+class PreparedStatements:
+    """
+    Server-side prepared statements for one pooled connection, one prepared
+    cursor per SQL string. mysql.connector only re-prepares when it is handed
+    a different string object than last time, so callers must pass the same
+    module-level constant on every call; the statement is then parsed once
+    per connection instead of once per query.
+
+    Not thread-safe: used only by the thread running a query on the connection.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursors: Dict[str, Any] = {}
+        self.prepares = 0
+
+    def execute(self, sql: str, params: tuple):
+        cursor = self._cursors.get(sql)
+        if cursor is None:
+            cursor = self._cursors[sql] = self._connection.cursor(prepared=True)
+            self.prepares += 1
+        try:
+            cursor.execute(sql, params)
+        except Exception:
+            self._discard(sql, cursor)
+            raise
+        return cursor
+
+    def _discard(self, sql: str, cursor):
+        # Leave no half-read result or broken statement behind for the next caller
+        self._cursors.pop(sql, None)
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+    def fetchall(self, sql: str, params: tuple) -> List[tuple]:
+        return self.execute(sql, params).fetchall()
+
+    def fetchone(self, sql: str, params: tuple) -> Optional[tuple]:
+        """First row or None; the rest of the result is drained so the cursor can be reused"""
+        rows = self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    def fetchchunks(self, sql: str, params: tuple, size: int) -> Iterator[List[tuple]]:
+        """Yield lists of at most size rows; a result that is not read to the end costs the cursor"""
+        cursor = self.execute(sql, params)
+        drained = False
+        try:
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    drained = True
+                    return
+                yield rows
+        finally:
+            if not drained:
+                self._discard(sql, cursor)
+
+    def __len__(self) -> int:
+        return len(self._cursors)
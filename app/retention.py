@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import datetime
+
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RowDelete(NamedTuple):
+    """Readings older than cutoff for user_ids (None: everyone)"""
+
+    cutoff: datetime.datetime
+    user_ids: Optional[List[int]]
+
+
+class RetentionPlan(NamedTuple):
+    """
+    Whole months older than partition_cutoff are dropped; shorter policies fall
+    back to row deletes. Months older than archive_cutoff that survive are
+    moved to the archive.
+    """
+
+    partition_cutoff: Optional[datetime.datetime]
+    deletes: List[RowDelete]
+    archive_cutoff: Optional[datetime.datetime] = None
+
+
+def plan_retention(now: datetime.datetime, default_days: int, policies: Dict[int, int], archive_days: int = 0) -> RetentionPlan:
+    """
+    Work out what may be removed. A partition holds every user's readings for
+    a month, so partitions are dropped on the default retention alone; it is
+    the longest anyone may keep readings, and policies that are longer, or 0
+    (forever), are capped to it. Users kept for less are trimmed row by row.
+    A default of 0 days keeps readings forever, as does archive_days 0 for MySQL.
+    """
+
+    horizon = default_days if default_days > 0 else None
+    partition_cutoff = now - datetime.timedelta(days=horizon) if horizon else None
+
+    by_days: Dict[int, List[int]] = {}
+    for user_id, days in policies.items():
+        if days > 0 and (horizon is None or days < horizon):
+            by_days.setdefault(days, []).append(user_id)
+
+    deletes = [
+        RowDelete(now - datetime.timedelta(days=days), sorted(user_ids))
+        for days, user_ids in sorted(by_days.items())
+    ]
+    archive_cutoff = now - datetime.timedelta(days=archive_days) if archive_days > 0 else None
+    return RetentionPlan(partition_cutoff, deletes, archive_cutoff)
+
+
+class SensorRetention:
+    """
+    Background maintenance for the month-partitioned sensordata table: keeps
+    months_ahead future partitions in place so inserts never land in the
+    overflow partition, removes readings past their retention, by dropping
+    partitions past the default and deleting rows for shorter policies, and
+    moves months older than archive_days out of MySQL into the archive.
+    """
+
+    def __init__(
+        self,
+        maintain: Callable[..., Awaitable[Optional[dict]]],
+        load_policies: Callable[[], Awaitable[Dict[int, int]]],
+        default_days: int = 0,
+        archive_days: int = 0,
+        months_ahead: int = 3,
+        interval: float = 3600,
+        batch_size: int = 10000,
+    ):
+        self._maintain = maintain
+        self._load_policies = load_policies
+        self.default_days = default_days
+        self.archive_days = archive_days
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.partitions_added = 0
+        self.partitions_dropped = 0
+        self.partitions_archived = 0
+        self.rows_deleted = 0
+        self.last_run: Optional[datetime.datetime] = None
+
+    async def run_once(self, now: Optional[datetime.datetime] = None) -> Optional[dict]:
+        """Apply one round of maintenance; None if another replica holds the maintenance lock"""
+        now = now or datetime.datetime.now()
+        plan = plan_retention(now, self.default_days, await self._load_policies(), self.archive_days)
+        result = await self._maintain(now, plan, self.months_ahead, self.batch_size)
+        if result is None:
+            self.skipped += 1
+            return None
+
+        self.runs += 1
+        self.last_run = now
+        self.partitions_added += len(result["added"])
+        self.partitions_dropped += len(result["dropped"])
+        self.partitions_archived += len(result["archived"])
+        self.rows_deleted += result["deleted"]
+        if result["added"] or result["dropped"] or result["archived"] or result["deleted"]:
+            logger.info(
+                f"Sensor retention: added {result['added']}, dropped {result['dropped']}, "
+                f"archived {result['archived']}, deleted {result['deleted']} rows"
+            )
+        return result
+
+    async def run_forever(self):
+        """Run maintenance now and then every interval seconds; run as a background task"""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Sensor retention maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        """Return run and removal counters"""
+        return {
+            "default_days": self.default_days,
+            "archive_days": self.archive_days,
+            "months_ahead": self.months_ahead,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "partitions_added": self.partitions_added,
+            "partitions_dropped": self.partitions_dropped,
+            "partitions_archived": self.partitions_archived,
+            "rows_deleted": self.rows_deleted,
+            "last_run": self.last_run,
+        }
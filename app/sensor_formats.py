@@ -0,0 +1,159 @@
+import io
+import csv
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.sensor_series import SensorSeries
+from app.serialization import dumps, dumps_line
+
+# Column names of a SensorSeries, as used by the row-oriented formats
+SENSOR_COLUMNS = ("timestamp", "temperature", "pressure", "temperature_unit", "pressure_unit")
+BUCKET_COLUMNS = SENSOR_COLUMNS + ("count",)
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": ARROW_MEDIA_TYPE,
+    "parquet": PARQUET_MEDIA_TYPE,
+}
+
+# Columnar layouts for raw rows and for bucketed rows (which carry a sample count)
+SENSOR_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("s")),
+    ("temperature", pa.float32()),
+    ("pressure", pa.float32()),
+    ("temperature_unit", pa.string()),
+    ("pressure_unit", pa.string()),
+])
+BUCKET_SCHEMA = SENSOR_SCHEMA.append(pa.field("count", pa.int64()))
+
+# Readings turned into dicts at a time while encoding the row-oriented JSON array
+RECORD_SLICE_ROWS = 5000
+
+
+def sensor_records(series: SensorSeries) -> list:
+    """One dict per reading, for the row-oriented JSON and NDJSON formats"""
+
+    columns = [series.datetimes(), series.temperature, series.pressure,
+               series.unit_column("temperature_unit"), series.unit_column("pressure_unit")]
+    if series.bucketed:
+        columns.append(series.count)
+    names = BUCKET_COLUMNS if series.bucketed else SENSOR_COLUMNS
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def records_json(series: SensorSeries) -> bytes:
+    """
+    The row-oriented JSON array of sensor_records(), encoded a slice at a time
+    so only one slice's dicts exist at once alongside the output bytes
+    """
+
+    buffer = io.BytesIO()
+    buffer.write(b"[")
+    for start in range(0, len(series), RECORD_SLICE_ROWS):
+        if start:
+            buffer.write(b",")
+        # Drop the slice's own brackets
+        buffer.write(dumps(sensor_records(series.slice(start, start + RECORD_SLICE_ROWS)))[1:-1])
+    buffer.write(b"]")
+    return buffer.getvalue()
+
+
+def ndjson_chunk(series: SensorSeries) -> bytes:
+    """Encode sensor readings as newline-delimited JSON objects"""
+
+    return b"".join(dumps_line(record) for record in sensor_records(series))
+
+
+def columnar_json(series: SensorSeries) -> dict:
+    """
+    Sensor readings as one array per column, handed to orjson as numpy arrays.
+    A unit that holds a single value is sent once as a string instead of
+    repeated on every row.
+    """
+
+    data = {
+        "timestamp": series.datetimes(),
+        "temperature": series.temperature,
+        "pressure": series.pressure,
+    }
+    for name in SENSOR_COLUMNS[3:]:
+        unit = getattr(series, name)
+        data[name] = list(unit) if isinstance(unit, tuple) else unit
+    if series.bucketed:
+        data["count"] = series.count
+    return data
+
+
+def csv_header() -> str:
+    return ",".join(SENSOR_COLUMNS) + "\r\n"
+
+
+def _csv_floats(values: np.ndarray) -> np.ndarray:
+    # Shortest float32 text, with missing readings left empty as before
+    return np.where(np.isnan(values), "", values.astype(str))
+
+
+def csv_chunk(series: SensorSeries) -> str:
+    """Encode sensor readings as CSV lines, without a header"""
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(zip(
+        np.datetime_as_string(series.datetimes(), unit="s"),
+        _csv_floats(series.temperature),
+        _csv_floats(series.pressure),
+        series.unit_column("temperature_unit"),
+        series.unit_column("pressure_unit"),
+    ))
+    return buffer.getvalue()
+
+
+def _unit_array(series: SensorSeries, name: str) -> pa.Array:
+    unit = getattr(series, name)
+    if isinstance(unit, tuple):
+        return pa.array(unit, type=pa.string())
+    return pa.repeat(pa.scalar(unit, type=pa.string()), len(series))
+
+
+def arrow_batch(series: SensorSeries, schema: pa.Schema = SENSOR_SCHEMA) -> pa.RecordBatch:
+    """Wrap the series' columns as an Arrow record batch, without going through Python objects"""
+
+    arrays = [
+        pa.array(series.timestamps, type=schema.field("timestamp").type),
+        # from_pandas: NaN marks a missing reading, which Arrow stores as null
+        pa.array(series.temperature, type=pa.float32(), from_pandas=True),
+        pa.array(series.pressure, type=pa.float32(), from_pandas=True),
+        _unit_array(series, "temperature_unit"),
+        _unit_array(series, "pressure_unit"),
+    ]
+    if series.bucketed:
+        arrays.append(pa.array(series.count, type=pa.int64()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+async def arrow_stream(chunks, schema: pa.Schema = SENSOR_SCHEMA):
+    """Encode an async iterable of SensorSeries chunks as an Arrow IPC stream, one record batch per chunk"""
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for series in chunks:
+            writer.write_batch(arrow_batch(series, schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+async def parquet_bytes(chunks, schema: pa.Schema = SENSOR_SCHEMA) -> bytes:
+    """Encode an async iterable of SensorSeries chunks as a zstd-compressed Parquet file"""
+
+    batches = [arrow_batch(series, schema) async for series in chunks]
+    sink = io.BytesIO()
+    pq.write_table(pa.Table.from_batches(batches, schema=schema), sink, compression="zstd")
+    return sink.getvalue()
@@ -0,0 +1,248 @@
+import datetime
+
+from operator import itemgetter
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+# A unit column is a single value when every row shares it (almost always),
+# otherwise a tuple with one entry per row
+Units = Union[str, None, tuple]
+
+
+def _units(rows: list, index: int) -> Units:
+    distinct = set(map(itemgetter(index), rows))
+    return distinct.pop() if len(distinct) == 1 else tuple(map(itemgetter(index), rows))
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_SECOND = datetime.timedelta(seconds=1)
+
+
+def _epoch_seconds(rows: list) -> np.ndarray:
+    values = map(itemgetter(0), rows)
+    if isinstance(rows[0][0], datetime.datetime):
+        # Far quicker than letting numpy parse datetime objects into datetime64
+        values = ((value - _EPOCH) // _SECOND for value in values)
+    return np.fromiter(values, dtype=np.int64, count=len(rows))
+
+
+def _column(rows: list, index: int, dtype) -> np.ndarray:
+    # One pass per column with no transposed tuples for the garbage collector
+    # to walk; None (SQL NULL) becomes NaN in float columns
+    return np.fromiter(map(itemgetter(index), rows), dtype=dtype, count=len(rows))
+
+
+class SensorSeries:
+    """
+    Sensor readings held column-wise instead of as one tuple or dict per row:
+    int64 epoch-second timestamps, float32 temperature and pressure with NaN
+    for missing values, and each unit held once when it does not vary.
+    Bucketed results also carry an int64 sample count per bucket.
+
+    Timestamps are naive, like the DATETIME columns they come from; the epoch
+    is 1970-01-01 00:00:00 in whatever zone the readings were stored in.
+    """
+
+    __slots__ = ("timestamps", "temperature", "pressure", "temperature_unit", "pressure_unit", "count")
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        temperature: np.ndarray,
+        pressure: np.ndarray,
+        temperature_unit: Units,
+        pressure_unit: Units,
+        count: Optional[np.ndarray] = None,
+    ):
+        self.timestamps = timestamps
+        self.temperature = temperature
+        self.pressure = pressure
+        self.temperature_unit = temperature_unit
+        self.pressure_unit = pressure_unit
+        self.count = count
+
+    @classmethod
+    def empty(cls, bucketed: bool = False) -> "SensorSeries":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+            (),
+            (),
+            np.empty(0, dtype=np.int64) if bucketed else None,
+        )
+
+    @classmethod
+    def from_rows(cls, rows: list, bucketed: bool = False) -> "SensorSeries":
+        """
+        Build from cursor rows of (timestamp, temperature, pressure,
+        temperature_unit, pressure_unit[, count]). Timestamps may be epoch
+        seconds or datetimes.
+        """
+        if not rows:
+            return cls.empty(bucketed)
+
+        return cls(
+            _epoch_seconds(rows),
+            _column(rows, 1, np.float32),
+            _column(rows, 2, np.float32),
+            _units(rows, 3),
+            _units(rows, 4),
+            _column(rows, 5, np.int64) if bucketed else None,
+        )
+
+    @classmethod
+    def concat(cls, parts: Iterable["SensorSeries"], bucketed: bool = False) -> "SensorSeries":
+        """Join series in order, e.g. chunks of one query or archived and recent readings"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty(bucketed)
+        if len(parts) == 1:
+            return parts[0]
+
+        def units(name: str) -> Units:
+            values = [getattr(part, name) for part in parts]
+            if all(not isinstance(value, tuple) for value in values) and len(set(values)) == 1:
+                return values[0]
+            return tuple(value for part in parts for value in part.unit_column(name))
+
+        return cls(
+            np.concatenate([part.timestamps for part in parts]),
+            np.concatenate([part.temperature for part in parts]),
+            np.concatenate([part.pressure for part in parts]),
+            units("temperature_unit"),
+            units("pressure_unit"),
+            np.concatenate([part.count for part in parts]) if bucketed else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def bucketed(self) -> bool:
+        return self.count is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the numeric columns"""
+        arrays = (self.timestamps, self.temperature, self.pressure) + ((self.count,) if self.bucketed else ())
+        return sum(array.nbytes for array in arrays)
+
+    def datetimes(self) -> np.ndarray:
+        """Timestamps as datetime64[s], a view that orjson and Arrow serialize directly"""
+        return self.timestamps.view("datetime64[s]")
+
+    def unit_column(self, name: str) -> tuple:
+        """One unit per row, for formats that have no way to say 'same for every row'"""
+        unit = getattr(self, name)
+        return unit if isinstance(unit, tuple) else (unit,) * len(self)
+
+    def slice(self, start: int, stop: int) -> "SensorSeries":
+        """Rows [start, stop) without copying the numeric columns"""
+
+        def units(name: str) -> Units:
+            unit = getattr(self, name)
+            return unit[start:stop] if isinstance(unit, tuple) else unit
+
+        return SensorSeries(
+            self.timestamps[start:stop],
+            self.temperature[start:stop],
+            self.pressure[start:stop],
+            units("temperature_unit"),
+            units("pressure_unit"),
+            self.count[start:stop] if self.bucketed else None,
+        )
+
+    def between(self, start: int, end: int) -> "SensorSeries":
+        """Readings with start <= timestamp <= end (epoch seconds); the series must be in time order"""
+        return self.slice(
+            int(np.searchsorted(self.timestamps, start, side="left")),
+            int(np.searchsorted(self.timestamps, end, side="right")),
+        )
+
+    def sorted(self) -> "SensorSeries":
+        """The series in time order; itself if it already is"""
+        if len(self) < 2 or not np.any(self.timestamps[1:] < self.timestamps[:-1]):
+            return self
+
+        order = np.argsort(self.timestamps, kind="stable")
+
+        def units(name: str) -> Units:
+            unit = getattr(self, name)
+            return tuple(unit[i] for i in order) if isinstance(unit, tuple) else unit
+
+        return SensorSeries(
+            self.timestamps[order],
+            self.temperature[order],
+            self.pressure[order],
+            units("temperature_unit"),
+            units("pressure_unit"),
+            self.count[order] if self.bucketed else None,
+        )
+
+    def aggregate(self, bucket_seconds: int, agg: str) -> "SensorSeries":
+        """
+        Bucket a time-ordered series the way the SQL bucket queries do: avg, min or
+        max ignoring missing values, or the last reading in each bucket. Units are
+        the bucket's smallest, or for last the last reading's; count is every row.
+        """
+        if not len(self):
+            return SensorSeries.empty(bucketed=True)
+
+        buckets = self.timestamps // bucket_seconds * bucket_seconds
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.append(starts[1:], len(self)) - 1
+        count = ends - starts + 1
+
+        def values(column: np.ndarray) -> np.ndarray:
+            if agg == "last":
+                return column[ends]
+            column = column.astype(np.float64)
+            if agg == "min":
+                return np.fmin.reduceat(column, starts).astype(np.float32)
+            if agg == "max":
+                return np.fmax.reduceat(column, starts).astype(np.float32)
+            present = ~np.isnan(column)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.add.reduceat(np.where(present, column, 0), starts) / np.add.reduceat(present, starts)
+            return mean.astype(np.float32)
+
+        def units(name: str) -> Units:
+            unit = getattr(self, name)
+            if not isinstance(unit, tuple):
+                return unit
+            if agg == "last":
+                return tuple(unit[i] for i in ends)
+            return tuple(
+                min((value for value in unit[start:end + 1] if value is not None), default=None)
+                for start, end in zip(starts, ends)
+            )
+
+        return SensorSeries(
+            buckets[starts],
+            values(self.temperature),
+            values(self.pressure),
+            units("temperature_unit"),
+            units("pressure_unit"),
+            count.astype(np.int64),
+        )
+
+    @classmethod
+    def from_arrow(cls, batch) -> "SensorSeries":
+        """Build from an Arrow record batch or table in SENSOR_SCHEMA layout; nulls become NaN"""
+        if batch.num_rows == 0:
+            return cls.empty()
+
+        def units(name: str) -> Units:
+            column = batch.column(name)
+            distinct = column.unique()
+            return distinct[0].as_py() if len(distinct) == 1 else tuple(column.to_pylist())
+
+        return cls(
+            batch.column("timestamp").cast("int64").to_numpy(),
+            batch.column("temperature").to_numpy(zero_copy_only=False).astype(np.float32, copy=False),
+            batch.column("pressure").to_numpy(zero_copy_only=False).astype(np.float32, copy=False),
+            units("temperature_unit"),
+            units("pressure_unit"),
+        )
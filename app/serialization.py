@@ -0,0 +1,39 @@
+import decimal
+import datetime
+
+import orjson
+
+from fastapi.responses import JSONResponse
+
+# Wire format of every datetime the API returns (ISO 8601, second precision, zone-less),
+# matching what orjson emits natively; since= and X-Latest-Timestamp use it too
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+ORJSON_OPTIONS = orjson.OPT_OMIT_MICROSECONDS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Serialize to UTF-8 JSON bytes, handling the types MySQL rows contain"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def dumps_line(content) -> bytes:
+    """Serialize one NDJSON line, newline included"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; the app's default response class"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -18,8 +18,17 @@ const lastWeekBtn = document.getElementById('lastWeekBtn');
 let deviceDataChart;
 let updateInterval;
 const UPDATE_FREQUENCY = 1000;
+const STREAM_FALLBACK_FREQUENCY = 30000;  // safety-net polling while the live stream is connected
+const MAX_CHART_POINTS = 500;
 let currentTimeRange = 'week';
 
+// Incremental polling state: points on the chart, newest reading seen and bucket width in use
+let chartDeviceId = null;
+let chartPoints = [];
+let latestTimestamp = null;
+let bucketSeconds = null;
+let deviceStream = null;
+
 // Weather API
 let userLocation = "";
 let currentTemperature = "";
@@ -32,7 +41,9 @@ const API_ENDPOINTS = {
     DEVICES: "/api/devices",
     DEVICE_DATA: "/api/devices",
     WARDROBE: "/api/wardrobe",
-    AI: "/api/ai"
+    AI: "/api/ai",
+    WEATHER: "/api/weather",
+    RECOMMENDATION: "/api/recommendation"
 };
 
 document.addEventListener('DOMContentLoaded', () => {
@@ -71,31 +82,16 @@ document.addEventListener('DOMContentLoaded', () => {
                 locationElement.textContent = `Location: ${location}`;
             }
             
-            const enc_city = encodeURIComponent(location);
-            const geoResponse = await fetch(`https://nominatim.openstreetmap.org/search?q=${enc_city}&format=json`);
-            const geoData = await geoResponse.json();
-            
-            if (!geoData || geoData.length === 0) {
-                console.error('Location not found');
+            const response = await fetch(API_ENDPOINTS.WEATHER, {method: 'GET', headers: {'Accept': 'application/json'}, credentials: 'same-origin'});
+            if (!response.ok) {
+                console.error(`Weather not available: ${response.status}`);
                 return;
             }
+            const weather = await response.json();
             
-            const lat = geoData[0].lat;
-            const lon = geoData[0].lon;
-            
-            const pointsResponse = await fetch(`https://api.weather.gov/points/${lat},${lon}`);
-            const pointsData = await pointsResponse.json();
-            
-            const forecastUrl = pointsData.properties.forecast;
-            const forecastResponse = await fetch(forecastUrl);
-            const forecastData = await forecastResponse.json();
-            
-            const currentPeriod = forecastData.properties.periods[0];
-            const nextPeriod = forecastData.properties.periods[1];
-            
-            currentTemperature = `${currentPeriod.temperature} ${currentPeriod.temperatureUnit}`;
-            currentConditions = currentPeriod.shortForecast;
-            forecastConditions = nextPeriod.shortForecast;
+            currentTemperature = `${weather.temperature} ${weather.temperature_unit}`;
+            currentConditions = weather.conditions;
+            forecastConditions = weather.forecast;
             
 
             if (tempElement) {
@@ -112,19 +108,6 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
-    // Get user's wardrobe
-    const getUserWardrobe = async () => {
-        try {
-            const response = await fetch(API_ENDPOINTS.WARDROBE, {method: 'GET', headers: {'Accept': 'application/json'}, credentials: 'same-origin'});   
-            
-            const wardrobe = await response.json();
-            return wardrobe;
-        } catch (error) {
-            console.error('Error fetching wardrobe:', error);
-            return [];
-        }
-    };
-
     // Function to initialize device dropdown
     const initDeviceDropdown = async () => {
         try {
@@ -161,6 +144,10 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (updateInterval) {
                     clearInterval(updateInterval);
                 }
+                if (deviceStream) {
+                    deviceStream.close();
+                    deviceStream = null;
+                }
                 updateDeviceDataChart([], []);
             }
         });
@@ -189,10 +176,14 @@ document.addEventListener('DOMContentLoaded', () => {
         
         const selectedDeviceId = deviceSelect.value;
         if (selectedDeviceId) {
+            resetChartState(selectedDeviceId);
             loadDeviceData(selectedDeviceId);
         }
     };
     
+    // Format a Date as the server's 'YYYY-MM-DDTHH:MM:SS' (timestamps are zone-less)
+    const formatTimestamp = (date) => date.toISOString().slice(0, 19);
+
     // Calculate time range based on current selection
     const calculateTimeRange = () => {
         const now = new Date();
@@ -205,22 +196,58 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         
         return {
-            startDate: startDate.toISOString().split('.')[0].replace('T', ' '),
-            endDate: now.toISOString().split('.')[0].replace('T', ' ')
+            startDate: formatTimestamp(startDate),
+            endDate: formatTimestamp(now)
         };
     };
     
-    // Load device sensor data with time filtering
-    const loadDeviceData = async (deviceId) => {
+    // Forget the points on the chart so the next load fetches the whole window
+    const resetChartState = (deviceId) => {
+        chartDeviceId = String(deviceId);
+        chartPoints = [];
+        latestTimestamp = null;
+        bucketSeconds = null;
+    };
+
+    // Expand a format=columnar response into one object per point; units may be sent once for all points
+    const columnsToPoints = (columns) => {
+        const unit = (value, i) => Array.isArray(value) ? value[i] : value;
+        return (columns.timestamp || []).map((timestamp, i) => {
+            const point = {
+                timestamp,
+                temperature: columns.temperature[i],
+                pressure: columns.pressure[i],
+                temperature_unit: unit(columns.temperature_unit, i),
+                pressure_unit: unit(columns.pressure_unit, i)
+            };
+            if (columns.count) {
+                point.count = columns.count[i];
+            }
+            return point;
+        });
+    };
+
+    // Load device sensor data with time filtering; incremental loads only fetch what is newer than the chart
+    const loadDeviceData = async (deviceId, incremental = false) => {
         try {
             const { startDate, endDate } = calculateTimeRange();
+            const since = incremental ? latestTimestamp : null;
     
             const url = new URL(`${API_ENDPOINTS.DEVICE_DATA}/${deviceId}/data`, window.location.origin);
             url.searchParams.append('start_date', startDate);
             url.searchParams.append('end_date', endDate);
+            url.searchParams.append('resolution', since && bucketSeconds ? bucketSeconds : 'auto');
+            url.searchParams.append('max_points', MAX_CHART_POINTS);
+            url.searchParams.append('format', 'columnar');
+            if (since) {
+                url.searchParams.append('since', since);
+            }
             
             const response = await fetch(url, {method: 'GET', headers: {'Accept': 'application/json'}, credentials: 'same-origin'});
             
+            if (response.status === 304) {
+                return;
+            }
             if (!response.ok) {
                 if (response.status === 401) {
                     window.location.href = '/login';
@@ -229,45 +256,123 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`HTTP error! Status: ${response.status}`);
             }
             
-            const data = await response.json();
-            if (!data) {
-                updateDeviceDataChart([], [], [], []);
+            const data = columnsToPoints(await response.json());
+            if (chartDeviceId !== String(deviceId) || since !== (incremental ? latestTimestamp : null)) {
+                // The device, range or cursor changed while this request was in flight
                 return;
             }
-            
-            const timestamps = data.map(item => {
-                const date = new Date(item.timestamp);
-                
-                if (currentTimeRange === 'day') {
-                    return date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-                } else {
-                    return `${date.toLocaleDateString([], {month: 'short', day: 'numeric'})} ${date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})}`;
-                }
-            });
-            
-            const temperatures = data.map(item => item.temperature);
-            const pressures = data.map(item => item.pressure);
-            const temperatureUnit = data.length > 0 ? data[0].temperature_unit : '°C';
-            const pressureUnit = data.length > 0 ? data[0].pressure_unit : 'Pa';
-            
-            updateDeviceDataChart(timestamps, temperatures, pressures, [temperatureUnit, pressureUnit]);
+
+            latestTimestamp = response.headers.get('X-Latest-Timestamp') || null;
+            bucketSeconds = parseInt(response.headers.get('X-Bucket-Seconds'), 10) || null;
+
+            if (since && data.length > 0) {
+                // Returned points replace any chart points at or after the first of them
+                const first = data[0].timestamp;
+                chartPoints = chartPoints.filter(item => item.timestamp < first && item.timestamp >= startDate).concat(data);
+            } else if (!since) {
+                chartPoints = data;
+            }
+
+            renderDeviceData();
         } catch (error) {
             console.error('Error loading device data:', error);
         }
     };
+
+    // Draw chartPoints on the device chart
+    const renderDeviceData = () => {
+        const timestamps = chartPoints.map(item => {
+            const date = new Date(item.timestamp);
+            
+            if (currentTimeRange === 'day') {
+                return date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+            } else {
+                return `${date.toLocaleDateString([], {month: 'short', day: 'numeric'})} ${date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})}`;
+            }
+        });
+        
+        const temperatures = chartPoints.map(item => item.temperature);
+        const pressures = chartPoints.map(item => item.pressure);
+        const temperatureUnit = chartPoints.length > 0 ? chartPoints[0].temperature_unit : '°C';
+        const pressureUnit = chartPoints.length > 0 ? chartPoints[0].pressure_unit : 'Pa';
+        
+        updateDeviceDataChart(timestamps, temperatures, pressures, [temperatureUnit, pressureUnit]);
+    };
     
-    // Start auto-updating device data
-    const startDeviceDataUpdates = (deviceId) => {
 
+    // Fold a pushed reading into the chart, merging it into the last bucket when aggregating
+    const appendReading = (reading) => {
+        if (latestTimestamp && reading.timestamp <= latestTimestamp) {
+            return;
+        }
+        latestTimestamp = reading.timestamp;
+
+        if (!bucketSeconds) {
+            chartPoints.push(reading);
+        } else {
+            const millis = Date.parse(reading.timestamp + 'Z');
+            const bucket = formatTimestamp(new Date(millis - millis % (bucketSeconds * 1000)));
+            const last = chartPoints[chartPoints.length - 1];
+
+            if (last && last.timestamp === bucket) {
+                const count = last.count || 1;
+                last.temperature = (last.temperature * count + reading.temperature) / (count + 1);
+                last.pressure = (last.pressure * count + reading.pressure) / (count + 1);
+                last.count = count + 1;
+            } else {
+                chartPoints.push({...reading, timestamp: bucket, count: 1});
+            }
+        }
+
+        const { startDate } = calculateTimeRange();
+        chartPoints = chartPoints.filter(item => item.timestamp >= startDate);
+        renderDeviceData();
+    };
+
+    // Poll at the given frequency, replacing any existing timer
+    const schedulePolling = (deviceId, frequency) => {
         if (updateInterval) {
             clearInterval(updateInterval);
         }
+        updateInterval = setInterval(() => {
+            loadDeviceData(deviceId, true);
+        }, frequency);
+    };
 
+    // Subscribe to live readings; polling slows down while the stream is up
+    const openDeviceStream = (deviceId) => {
+        if (deviceStream) {
+            deviceStream.close();
+            deviceStream = null;
+        }
+        if (!window.EventSource || !deviceId) {
+            return;
+        }
+
+        deviceStream = new EventSource(`${API_ENDPOINTS.DEVICE_DATA}/${deviceId}/stream`);
+        deviceStream.onopen = () => {
+            // Catch up on anything stored between the last poll and the subscription
+            loadDeviceData(deviceId, true);
+            schedulePolling(deviceId, STREAM_FALLBACK_FREQUENCY);
+        };
+        deviceStream.onmessage = (event) => {
+            if (chartDeviceId === String(deviceId)) {
+                appendReading(JSON.parse(event.data));
+            }
+        };
+        deviceStream.onerror = () => {
+            schedulePolling(deviceId, UPDATE_FREQUENCY);
+        };
+    };
+
+    // Start auto-updating device data
+    const startDeviceDataUpdates = (deviceId) => {
+
+        resetChartState(deviceId);
         loadDeviceData(deviceId);
         
-        updateInterval = setInterval(() => {
-            loadDeviceData(deviceId);
-        }, UPDATE_FREQUENCY);
+        schedulePolling(deviceId, UPDATE_FREQUENCY);
+        openDeviceStream(deviceId);
     };
     
     // Initialize device data chart
@@ -374,38 +479,17 @@ document.addEventListener('DOMContentLoaded', () => {
                 aiMessageElement.textContent = "Thinking about what you should wear...";
             }
             
-            const wardrobe = await getUserWardrobe();
-            const clothingList = wardrobe.map(item => {
-                if (item.color) {
-                    return `${item.color} ${item.name}`;
-                }
-                return item.name;
-            }).join(', ');
-
-            let aiPrompt;
-            if (wardrobe.length !== 0){
-                aiPrompt = {
-                    prompt: `It is currently ${currentTemperature} and ${currentConditions} outside and forecasted to be ${forecastConditions}. 
-                    I need to decide what to wear from the following list: ${clothingList}. What should I wear? Do not comment on non chosen items.`
-                };
-            } else {
-                aiPrompt = {
-                    prompt: `It is currently ${currentTemperature} and ${currentConditions} outside and forecasted to be ${forecastConditions}. 
-                    The user does not have any clothes added to their wardrobe, tell them so and what they should buy to fit the current conditions.`
-                };
-            }
-            
-            const response = await fetch(API_ENDPOINTS.AI, {method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(aiPrompt)});
+            const response = await fetch(API_ENDPOINTS.RECOMMENDATION, {method: 'GET', headers: {'Accept': 'application/json'}, credentials: 'same-origin'});
             
             if (!response.ok) {
-                throw new Error(`AI API error! Status: ${response.status}`);
+                throw new Error(`Recommendation API error! Status: ${response.status}`);
             }
             
             const data = await response.json();
-            if (aiMessageElement && data.result && data.result.response) {
-                aiMessageElement.textContent = data.result.response;
+            if (aiMessageElement && data.recommendation) {
+                aiMessageElement.textContent = data.recommendation;
             } else {
-                throw new Error('Invalid AI response format');
+                throw new Error('Invalid recommendation response format');
             }
             
         } catch (error) {
@@ -0,0 +1,102 @@
+import os
+import re
+import html
+import asyncio
+import hashlib
+import logging
+
+from types import MappingProxyType
+from typing import Callable, List, Mapping, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+logger = logging.getLogger(__name__)
+
+# {name} placeholders substituted by render(); CSS/JS braces never match since they hold more than a word
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+class Page(NamedTuple):
+    """A template pre-encoded for serving"""
+
+    body: bytes
+    etag: str
+    parts: List[str]  # literal text and placeholder names, alternating
+    mtime: float
+
+
+class TemplateCache:
+    """
+    HTML templates read once at startup and kept as encoded bytes with strong
+    ETags, so page routes do no disk I/O. With reload enabled (development),
+    watch() picks up edited files without a restart. transform, if given,
+    is applied to each file's text before it is cached.
+    """
+
+    def __init__(self, directory: str, reload: bool = False, transform: Optional[Callable[[str], str]] = None):
+        self.directory = directory
+        self.reload = reload
+        self.transform = transform
+        self._pages: Mapping[str, Page] = MappingProxyType({})
+
+    def load(self):
+        """Read every template in the directory, replacing the whole cache at once"""
+        pages = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".html"):
+                pages[name] = self._read(name)
+        self._pages = MappingProxyType(pages)
+        logger.info(f"Loaded {len(pages)} templates from {self.directory}")
+
+    def get(self, name: str) -> Page:
+        return self._pages[name]
+
+    def response(self, request: Request, name: str, status_code: int = 200) -> Response:
+        """Serve a template, answering 304 when the client already has this version"""
+        page = self._pages[name]
+        headers = {"ETag": page.etag, "Cache-Control": "no-cache"}
+        if status_code == 200 and request.headers.get("if-none-match") == page.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=page.body, status_code=status_code, media_type="text/html", headers=headers)
+
+    def render(self, name: str, **values) -> bytes:
+        """Fill {name} placeholders with HTML-escaped values"""
+        parts = self._pages[name].parts
+        rendered = []
+        for i, part in enumerate(parts):
+            if i % 2 == 0:
+                rendered.append(part)
+            else:
+                value = values.get(part)
+                rendered.append("{" + part + "}" if value is None else html.escape(str(value)))
+        return "".join(rendered).encode("utf-8")
+
+    async def watch(self, interval: float = 1.0, run: Callable = asyncio.to_thread):
+        """Reload templates whose files changed; meant for development only. Disk access goes through run()"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await run(self._changed):
+                    await run(self.load)
+            except Exception as e:
+                logger.warning(f"Template reload failed: {e}")
+
+    def _changed(self) -> bool:
+        names = {name for name in os.listdir(self.directory) if name.endswith(".html")}
+        if names != set(self._pages):
+            return True
+        return any(
+            os.path.getmtime(os.path.join(self.directory, name)) != page.mtime
+            for name, page in self._pages.items()
+        )
+
+    def _read(self, name: str) -> Page:
+        path = os.path.join(self.directory, name)
+        mtime = os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if self.transform is not None:
+            text = self.transform(text)
+        body = text.encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return Page(body, etag, PLACEHOLDER.split(text), mtime)
@@ -0,0 +1,8 @@
+import re
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def collapse_whitespace(text: str) -> str:
+    """Runs of whitespace become one space, with none at either end"""
+    return WHITESPACE.sub(" ", text).strip()
@@ -0,0 +1,164 @@
+import logging
+
+from typing import NamedTuple, Optional, Tuple
+
+import httpx
+
+from app.cache import SingleFlight, TTLCache
+from app.text import collapse_whitespace
+
+logger = logging.getLogger(__name__)
+
+# Cached in place of a geocode or grid point that the upstream does not have
+_NOT_FOUND = object()
+
+
+class GridPoint(NamedTuple):
+    """A National Weather Service forecast grid cell"""
+
+    office: str
+    x: int
+    y: int
+    forecast_url: str
+
+
+def location_key(location: str) -> str:
+    """Users typing 'San Diego' and ' san  diego ' share one geocode"""
+    return collapse_whitespace(location).lower()
+
+
+class WeatherService:
+    """
+    Current conditions for a free-text location via Nominatim and
+    api.weather.gov. Geocodes and grid points rarely change, so they are kept
+    for geocode_ttl seconds; places and points the upstreams do not know (a
+    misspelling, somewhere outside the US) are remembered for negative_ttl.
+    Forecasts are cached per grid point for forecast_ttl seconds, so every
+    user in the same area shares one lookup.
+    """
+
+    def __init__(
+        self,
+        geocode_url: str = "https://nominatim.openstreetmap.org/search",
+        weather_url: str = "https://api.weather.gov",
+        user_agent: str = "ece140-wardrobe",
+        forecast_ttl: float = 900,
+        forecast_cache_size: int = 1024,
+        geocode_ttl: float = 86400,
+        geocode_cache_size: int = 4096,
+        negative_ttl: float = 300,
+        timeout: float = 10.0,
+    ):
+        self.geocode_url = geocode_url
+        self.weather_url = weather_url.rstrip("/")
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+
+        self.geocodes = TTLCache(maxsize=geocode_cache_size, ttl=geocode_ttl)
+        self.grid_points = TTLCache(maxsize=geocode_cache_size, ttl=geocode_ttl)
+        self.forecasts = TTLCache(maxsize=forecast_cache_size, ttl=forecast_ttl)
+        self._flights = SingleFlight()
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.upstream_calls = 0
+
+    async def start(self):
+        """Open the shared HTTP client (both upstreams require a User-Agent)"""
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": self.user_agent, "Accept": "application/geo+json, application/json"},
+            timeout=self.timeout,
+            follow_redirects=True,
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def current(self, location: str) -> Optional[dict]:
+        """Return the current and next forecast period for a location, or None if it cannot be found"""
+        coordinates = await self.geocode(location)
+        if coordinates is None:
+            return None
+
+        grid = await self.grid_point(*coordinates)
+        if grid is None:
+            return None
+        key = (grid.office, grid.x, grid.y)
+        forecast = self.forecasts.get(key)
+        if forecast is None:
+            forecast, _ = await self._flights.run(("forecast",) + key, lambda: self._fetch_forecast(grid))
+        return forecast
+
+    async def geocode(self, location: str) -> Optional[Tuple[float, float]]:
+        """Latitude and longitude of a place name; misses are remembered for negative_ttl"""
+        key = location_key(location)
+        coordinates = self.geocodes.get(key)
+        if coordinates is None:
+            coordinates, _ = await self._flights.run(("geocode", key), lambda: self._fetch_geocode(key))
+        return None if coordinates is _NOT_FOUND else coordinates
+
+    async def grid_point(self, lat: float, lon: float) -> Optional[GridPoint]:
+        """The forecast grid cell for a point, or None outside api.weather.gov's coverage"""
+        key = (round(lat, 4), round(lon, 4))
+        grid = self.grid_points.get(key)
+        if grid is None:
+            grid, _ = await self._flights.run(("points",) + key, lambda: self._fetch_grid_point(*key))
+        return None if grid is _NOT_FOUND else grid
+
+    async def _get(self, url: str, params: Optional[dict] = None):
+        if self._client is None:
+            raise RuntimeError("Weather service is not started")
+        self.upstream_calls += 1
+        response = await self._client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch_geocode(self, key: str):
+        results = await self._get(self.geocode_url, {"q": key, "format": "json", "limit": 1})
+        if not results:
+            logger.info(f"No geocode result for location '{key}'")
+            self.geocodes.set(key, _NOT_FOUND, ttl=self.negative_ttl)
+            return _NOT_FOUND
+        coordinates = (float(results[0]["lat"]), float(results[0]["lon"]))
+        self.geocodes.set(key, coordinates)
+        return coordinates
+
+    async def _fetch_grid_point(self, lat: float, lon: float):
+        try:
+            properties = (await self._get(f"{self.weather_url}/points/{lat},{lon}"))["properties"]
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            logger.info(f"No forecast grid point for {lat},{lon}")
+            self.grid_points.set((lat, lon), _NOT_FOUND, ttl=self.negative_ttl)
+            return _NOT_FOUND
+        grid = GridPoint(properties["gridId"], properties["gridX"], properties["gridY"], properties["forecast"])
+        self.grid_points.set((lat, lon), grid)
+        return grid
+
+    async def _fetch_forecast(self, grid: GridPoint) -> dict:
+        periods = (await self._get(grid.forecast_url))["properties"]["periods"]
+        current, following = periods[0], periods[1] if len(periods) > 1 else periods[0]
+        forecast = {
+            "temperature": current["temperature"],
+            "temperature_unit": current["temperatureUnit"],
+            "conditions": current["shortForecast"],
+            "forecast": following["shortForecast"],
+            "period": current.get("name"),
+            "grid": f"{grid.office}/{grid.x},{grid.y}",
+        }
+        self.forecasts.set((grid.office, grid.x, grid.y), forecast)
+        return forecast
+
+    def stats(self) -> dict:
+        """Return cache sizes and upstream counters"""
+        return {
+            "geocodes": self.geocodes.stats(),
+            "grid_points": self.grid_points.stats(),
+            "forecasts": self.forecasts.stats(),
+            "inflight": len(self._flights),
+            "coalesced": self._flights.coalesced,
+            "upstream_calls": self.upstream_calls,
+        }
@@ -0,0 +1,91 @@
+"""
+Serialization throughput for a sensor payload, old path against new.
+
+Builds synthetic (timestamp, temperature, pressure, unit, unit) rows like
+get_sensorData returns and times, per repetition:
+
+  json      the previous route: strftime + dict per row, then json.dumps
+  orjson    dict per row with datetimes left for orjson, via app.serialization.dumps
+  columnar  the same rows with epoch-second timestamps, as get_sensorData now
+            selects them, into a SensorSeries, app.sensor_formats.columnar_json,
+            then app.serialization.dumps
+
+No database is needed.
+
+    python -m benchmarks.json_serialization --rows 50000 --repeat 20
+"""
+
+import json
+import time
+import argparse
+import datetime
+import statistics
+
+from app.serialization import dumps
+from app.sensor_series import SensorSeries
+from app.sensor_formats import SENSOR_COLUMNS, columnar_json
+
+
+def make_rows(count: int) -> list:
+    start = datetime.datetime(2025, 1, 1)
+    return [
+        (start + datetime.timedelta(seconds=i), 20 + (i % 500) / 100, 1000 + (i % 300) / 10, "°C", "hPa")
+        for i in range(count)
+    ]
+
+
+def with_epoch_seconds(rows: list) -> list:
+    epoch = datetime.datetime(1970, 1, 1)
+    return [(int((record[0] - epoch).total_seconds()),) + record[1:] for record in rows]
+
+
+def stdlib_json(rows: list) -> bytes:
+    formatted = []
+    for record in rows:
+        formatted.append({
+            "timestamp": record[0].strftime('%Y-%m-%d %H:%M:%S'),
+            "temperature": record[1],
+            "pressure": record[2],
+            "temperature_unit": record[3],
+            "pressure_unit": record[4]
+        })
+    return json.dumps(formatted, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_rows(rows: list) -> bytes:
+    return dumps([dict(zip(SENSOR_COLUMNS, record)) for record in rows])
+
+
+def orjson_columnar(rows: list) -> bytes:
+    return dumps(columnar_json(SensorSeries.from_rows(rows)))
+
+
+def bench(name: str, func, rows: list, repeat: int, baseline=None) -> float:
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        began = time.perf_counter()
+        size = len(func(rows))
+        timings.append(time.perf_counter() - began)
+
+    median = statistics.median(timings)
+    speedup = f"{baseline / median:6.1f}x" if baseline else "      -"
+    print(f"{name:<10} {median * 1000:9.2f} ms   {len(rows) / median / 1e6:6.2f} M rows/s   {size / 1e6:7.2f} MB   {speedup}")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{args.rows:,} rows, median of {args.repeat} runs")
+    baseline = bench("json", stdlib_json, rows, args.repeat)
+    bench("orjson", orjson_rows, rows, args.repeat, baseline)
+    bench("columnar", orjson_columnar, with_epoch_seconds(rows), args.repeat, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Does a stalled database hold up requests that never touch it?
+
+Starts a TCP listener that accepts connections and never answers (a MySQL
+server hung during the handshake), points the app's pool at it, and then for
+--duration seconds keeps --db-concurrency sensor ingest requests in flight,
+each for a MAC the device registry has not seen, so each needs a query. Meanwhile
+it times GET / and a static asset one after another. Requests go through the
+ASGI app in this process and event loop, so any blocking call on the loop
+shows up directly in the page latencies.
+
+--blocking runs the pool's blocking calls on the event loop itself, which is
+what a connect retry with time.sleep amounted to, for comparison.
+
+    python -m benchmarks.loop_stall --duration 10 --db-concurrency 50
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+from collections import Counter
+
+
+async def blackhole(reader, writer):
+    """Accept a connection and say nothing until the client gives up"""
+    try:
+        await reader.read()
+    finally:
+        writer.close()
+
+
+def report(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<14} n={len(latencies):<6} p50 {statistics.median(latencies):9.2f} ms   p95 {p95:9.2f} ms   max {latencies[-1]:9.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--db-concurrency", type=int, default=50)
+    parser.add_argument("--stall", type=int, default=5, help="seconds each connect hangs before timing out")
+    parser.add_argument("--blocking", action="store_true", help="run blocking pool calls on the event loop")
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(blackhole, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    os.environ.update({
+        "MYSQL_HOST": "127.0.0.1",
+        "MYSQL_PORT": str(port),
+        "MYSQL_POOL_MIN_SIZE": "0",
+        "MYSQL_CONNECT_TIMEOUT": str(args.stall),
+        "MYSQL_CONNECT_RETRIES": "1",
+        "MYSQL_POOL_ACQUIRE_TIMEOUT": str(args.stall * 2),
+    })
+
+    import httpx
+    from app import main as app_main
+    from app.database import init_db_pool, close_db_pool
+
+    pool = await init_db_pool()
+    if args.blocking:
+        async def inline(func, *a, **kw):
+            return func(*a, **kw)
+        pool.run = inline
+    await app_main.file_executor.run(app_main.assets.build)
+    await app_main.file_executor.run(app_main.templates.load)
+    asset = app_main.assets.url("css/index.css")
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+    deadline = time.perf_counter() + args.duration
+    statuses = Counter()
+    page_latencies, asset_latencies = [], []
+    sequence = 0
+
+    async def ingest_worker():
+        nonlocal sequence
+        while time.perf_counter() < deadline:
+            sequence += 1
+            mac = f"02:00:00:{sequence >> 16 & 255:02x}:{sequence >> 8 & 255:02x}:{sequence & 255:02x}"
+            response = await client.post(f"/api/sensor-data/{mac}", json={"temperature": 21.5, "pressure": 1013.2})
+            statuses[response.status_code] += 1
+            if response.status_code == 503:
+                await asyncio.sleep(0.05)
+
+    async def page_worker():
+        while time.perf_counter() < deadline:
+            for path, latencies in (("/", page_latencies), (asset, asset_latencies)):
+                began = time.perf_counter()
+                await client.get(path)
+                latencies.append((time.perf_counter() - began) * 1000)
+            await asyncio.sleep(0.01)
+
+    print(f"DB stalled for {args.stall}s per connect, {args.db_concurrency} ingest requests in flight, "
+          f"{'blocking' if args.blocking else 'offloaded'} pool calls")
+    await asyncio.gather(page_worker(), *(ingest_worker() for _ in range(args.db_concurrency)))
+
+    report("GET /", page_latencies)
+    report("GET asset", asset_latencies)
+    print("ingest statuses", dict(sorted(statuses.items())))
+    print("pool", pool.stats())
+
+    await client.aclose()
+    server.close()
+    await close_db_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
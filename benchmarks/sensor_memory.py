@@ -0,0 +1,94 @@
+"""
+Peak memory of a sensor range read and its JSON response, row path against SensorSeries.
+
+Simulates a 7-day, 1 Hz range (604,800 readings) coming off a cursor, like
+get_sensorData, and measures the tracemalloc peak, up to the encoded body, for:
+
+  rows      fetchall() into tuples of (datetime, float, float, str, str), then
+            the dict per row the JSON route used to build, serialized whole
+  series    fetchmany() in SERIES_FETCH_ROWS chunks of (epoch seconds, float,
+            float, str, str) rows, each converted to a SensorSeries and
+            concatenated, then encoded as the default JSON array by
+            records_json
+  columnar  the same SensorSeries encoded as format=columnar
+
+No database is needed.
+
+    python -m benchmarks.sensor_memory --days 7
+"""
+
+import gc
+import time
+import argparse
+import datetime
+import tracemalloc
+
+from app.database import SERIES_FETCH_ROWS
+from app.sensor_formats import SENSOR_COLUMNS, columnar_json, records_json
+from app.sensor_series import SensorSeries
+from app.serialization import dumps
+
+START = datetime.datetime(2025, 1, 1)
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def reading(i: int) -> tuple:
+    # Values the driver creates fresh per row, as it would from the wire
+    return (20 + (i % 500) / 100, 1000 + (i % 300) / 10, "°C", "hPa")
+
+
+def fetch_rows(count: int) -> list:
+    return [(START + datetime.timedelta(seconds=i),) + reading(i) for i in range(count)]
+
+
+def fetch_chunks(count: int, size: int):
+    base = int((START - EPOCH).total_seconds())
+    for offset in range(0, count, size):
+        yield [(base + i,) + reading(i) for i in range(offset, min(offset + size, count))]
+
+
+def row_path(count: int):
+    rows = fetch_rows(count)
+    return dumps([dict(zip(SENSOR_COLUMNS, record)) for record in rows])
+
+
+def fetch_series(count: int) -> SensorSeries:
+    return SensorSeries.concat(SensorSeries.from_rows(rows) for rows in fetch_chunks(count, SERIES_FETCH_ROWS))
+
+
+def series_path(count: int):
+    return records_json(fetch_series(count))
+
+
+def columnar_path(count: int):
+    return dumps(columnar_json(fetch_series(count)))
+
+
+def measure(name: str, func, count: int):
+    gc.collect()
+    tracemalloc.start()
+    began = time.perf_counter()
+    result = func(count)
+    elapsed = time.perf_counter() - began
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"{name:<9} peak {peak / 2**20:8.1f} MiB   retained {retained / 2**20:8.1f} MiB   {elapsed:6.2f} s")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+
+    count = int(args.days * 86400)
+    print(f"{count:,} readings")
+    rows = measure("rows", row_path, count)
+    series = measure("series", series_path, count)
+    columnar = measure("columnar", columnar_path, count)
+    print(f"peak reduced {rows / series:.1f}x (json), {rows / columnar:.1f}x (columnar)")
+
+
+if __name__ == "__main__":
+    main()
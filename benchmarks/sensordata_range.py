@@ -0,0 +1,158 @@
+"""
+Range-query latency for sensordata with and without the
+(user_id, device_id, timestamp) index.
+
+Loads the same synthetic readings into two scratch tables, one with the
+schema from before migration 2 and one with the current schema, then
+times the get_sensorData query against both. Uses the MYSQL_* settings
+from .env; the scratch tables are dropped afterwards unless --keep is set.
+
+    python -m benchmarks.sensordata_range --rows 10000000 --devices 50
+"""
+
+import time
+import random
+import argparse
+import datetime
+import statistics
+
+from app.database import get_db_connection
+
+UNINDEXED = "bench_sensordata_before"
+INDEXED = "bench_sensordata_after"
+
+SCHEMAS = {
+    UNINDEXED: f"""
+        CREATE TABLE {UNINDEXED} (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            device_id VARCHAR(100) NOT NULL,
+            temperature FLOAT,
+            pressure FLOAT,
+            temperature_unit VARCHAR(50) NOT NULL,
+            pressure_unit VARCHAR(50) NOT NULL,
+            timestamp DATETIME NOT NULL
+        )
+    """,
+    INDEXED: f"""
+        CREATE TABLE {INDEXED} (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            device_id INT NOT NULL,
+            temperature FLOAT,
+            pressure FLOAT,
+            temperature_unit VARCHAR(50) NOT NULL,
+            pressure_unit VARCHAR(50) NOT NULL,
+            timestamp DATETIME NOT NULL,
+            KEY idx_sensordata_user_device_ts (user_id, device_id, timestamp)
+        )
+    """,
+}
+
+RANGE_QUERY = """
+    SELECT timestamp, temperature, pressure, temperature_unit, pressure_unit
+    FROM {table}
+    WHERE timestamp BETWEEN %s AND %s
+    AND user_id = %s
+    AND device_id = %s
+    ORDER BY timestamp
+"""
+
+
+def populate(connection, rows: int, devices: int, chunk: int, start: datetime.datetime):
+    """Insert identical synthetic readings into both scratch tables"""
+
+    cursor = connection.cursor()
+    for table, schema in SCHEMAS.items():
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(schema)
+
+    per_device = rows // devices
+    inserted = 0
+    began = time.perf_counter()
+    while inserted < rows:
+        batch = []
+        for i in range(inserted, min(inserted + chunk, rows)):
+            device = i % devices + 1
+            timestamp = start + datetime.timedelta(seconds=i // devices)
+            batch.append((device, device, 20 + random.random() * 5, 1000 + random.random() * 20, "°C", "hPa", timestamp))
+
+        for table in SCHEMAS:
+            cursor.executemany(
+                f"""
+                INSERT INTO {table} (user_id, device_id, temperature, pressure, temperature_unit, pressure_unit, timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """,
+                batch
+            )
+        connection.commit()
+        inserted += len(batch)
+        print(f"\rloaded {inserted:,}/{rows:,} rows ({time.perf_counter() - began:.0f}s)", end="", flush=True)
+
+    print()
+    cursor.execute("ANALYZE TABLE " + ", ".join(SCHEMAS))
+    cursor.fetchall()
+    cursor.close()
+    return per_device
+
+
+def time_queries(connection, table: str, queries: list) -> list:
+    """Run each (start, end, user_id, device_id) query and return latencies in ms"""
+
+    cursor = connection.cursor()
+    latencies = []
+    for params in queries:
+        began = time.perf_counter()
+        cursor.execute(RANGE_QUERY.format(table=table), params)
+        cursor.fetchall()
+        latencies.append((time.perf_counter() - began) * 1000)
+    cursor.close()
+    return latencies
+
+
+def report(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<10} p50 {statistics.median(latencies):10.2f} ms   p95 {p95:10.2f} ms   max {latencies[-1]:10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--chunk", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--window-hours", type=float, default=24.0)
+    parser.add_argument("--skip-load", action="store_true", help="reuse scratch tables from a previous run")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    args = parser.parse_args()
+
+    start = datetime.datetime(2025, 1, 1)
+    connection = get_db_connection()
+    try:
+        if not args.skip_load:
+            populate(connection, args.rows, args.devices, args.chunk, start)
+
+        span = datetime.timedelta(seconds=args.rows // args.devices)
+        window = datetime.timedelta(hours=args.window_hours)
+        queries = []
+        for _ in range(args.queries):
+            device = random.randint(1, args.devices)
+            offset = random.random() * max((span - window).total_seconds(), 0)
+            time_start = start + datetime.timedelta(seconds=offset)
+            queries.append((time_start, time_start + window, device, device))
+
+        print(f"{args.queries} range queries over {args.window_hours}h windows, {args.rows:,} rows")
+        report("before", time_queries(connection, UNINDEXED, queries))
+        report("after", time_queries(connection, INDEXED, queries))
+    finally:
+        if not args.keep:
+            cursor = connection.cursor()
+            for table in SCHEMAS:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.close()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()